@@ -0,0 +1,229 @@
+import copy
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import simpy
+
+try:
+    import resource
+except ImportError:  # Windows has no resource module
+    resource = None
+
+from profiler import CountingEnvironment
+from sweep import DEFAULT_OPTIONS, load_inputs, operate_day
+
+# Global Variables -------------------
+n_days = 3  # timed days per scenario
+case = 0  # timetable case simulated by every scenario (0-based)
+load_factors = [2, 5, 10]  # passenger load multipliers of psn_iat.csv and psn_idt.csv
+compact_queues = True  # False benchmarks Passenger objects instead of timestamp queues
+seed = 0
+regression_threshold = 0.1  # relative slowdown (or memory growth) reported as a regression
+result_path = 'output/benchmark.json'
+baseline_path = 'output/benchmark_baseline.json'
+save_baseline = False  # overwrite the baseline with this run instead of comparing against it
+# ------------------------------------
+
+
+def scenario_tables(tables, scenario):
+    """ParamTables of a benchmark scenario.
+
+    :param tables: param_tables.ParamTables read from csv.
+    :param scenario: 'baseline', 'peak' (every hour has the passenger rates of the busiest hour)
+        or 'load{k}' (k times the passenger rates of every hour, ex: 'load2').
+    :return: param_tables.ParamTables
+    """
+    if scenario == 'baseline':
+        return tables
+    scaled = copy.copy(tables)
+    if scenario == 'peak':
+        peak = int(np.argmax((1 / tables.psn_iat[:, :, 0]).sum(axis=1)))
+        scaled.psn_iat = np.repeat(tables.psn_iat[peak:peak + 1], tables.n_zones, axis=0)
+        scaled.psn_idt = np.repeat(tables.psn_idt[peak:peak + 1], tables.n_zones, axis=0)
+        return scaled
+    factor = float(scenario[len('load'):])
+    # mean and std shrink together, so no inter-arrival time becomes negative
+    scaled.psn_iat = tables.psn_iat / factor
+    scaled.psn_idt = tables.psn_idt / factor
+    return scaled
+
+
+class GCTimer:
+    """Wall time and number of garbage collections, measured through gc.callbacks while active.
+
+    Attributes
+    ----------
+    seconds : float
+        Total time spent in garbage collections.
+    collections : list[int]
+        Number of collections per generation.
+
+    """
+    def __init__(self):
+        self.seconds = 0
+        self.collections = [0, 0, 0]
+        self._start = 0
+
+    def __enter__(self):
+        gc.callbacks.append(self._callback)
+        return self
+
+    def __exit__(self, *exc_info):
+        gc.callbacks.remove(self._callback)
+
+    def _callback(self, phase, info):
+        if phase == 'start':
+            self._start = time.perf_counter()
+        else:
+            self.seconds += time.perf_counter() - self._start
+            self.collections[info['generation']] += 1
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where the resource module is missing (Windows).
+
+    ru_maxrss is reported in bytes on macOS and in kilobytes on Linux and other Unix systems.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_scenario(scenario, case, n_days, options):
+    """Time n_days of a scenario, then simulate one more day counting events and traced memory.
+
+    Meant to run in a fresh process, so peak RSS belongs to this scenario only.
+
+    :param scenario: Scenario name. (see scenario_tables)
+    :param case: Timetable case (0-based).
+    :param n_days: Number of timed days.
+    :param options: dict of simulation options passed to sweep.operate_day.
+    :return: dict of benchmark metrics.
+    """
+    inputs = load_inputs()
+    inputs = {**inputs, 'tables': scenario_tables(inputs['tables'], scenario)}
+
+    wall_times = []
+    passengers = 0
+    with GCTimer() as gc_timer:
+        for day in range(n_days):
+            start = time.perf_counter()
+            operation = operate_day(inputs, case, day, options)
+            wall_times.append(time.perf_counter() - start)
+            passengers += operation['passengers'] + operation['renege']
+
+    # events and memory do not depend on timing, so they are measured on a separate untimed day
+    env = CountingEnvironment()
+    tracemalloc.start()
+    operation = operate_day(inputs, case, 0, options, env)
+    traced_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    day_passengers = max(operation['passengers'] + operation['renege'], 1)
+
+    return {
+        'passengers_per_day': passengers / n_days,
+        'wall_time_per_day': sum(wall_times) / n_days,
+        'best_wall_time_per_day': min(wall_times),
+        'events_per_day': env.n_events,
+        'events_per_sec': env.n_events / (sum(wall_times) / n_days),
+        'peak_rss_mb': peak_rss_mb(),
+        'traced_peak_bytes_per_passenger': traced_peak / day_passengers,
+        'gc_seconds_per_day': gc_timer.seconds / n_days,
+        'gc_share': gc_timer.seconds / sum(wall_times),
+        'gc_collections_per_day': [n / n_days for n in gc_timer.collections],
+    }
+
+
+def run_benchmark(scenarios, case=0, n_days=3, options=None):
+    """Run every scenario in its own fresh process, one after another.
+
+    :param scenarios: List of scenario names. (see scenario_tables)
+    :param case: Timetable case (0-based).
+    :param n_days: Number of timed days per scenario.
+    :param options: dict of simulation options. Missing keys take values of sweep.DEFAULT_OPTIONS.
+    :return: dict of run settings and metrics per scenario.
+    """
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for scenario in scenarios:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results[scenario] = pool.submit(run_scenario, scenario, case, n_days, options).result()
+    return {
+        'platform': sys.platform,
+        'python': platform.python_version(),
+        'simpy': simpy.__version__,
+        'case': case,
+        'n_days': n_days,
+        'options': {key: value for key, value in options.items() if key not in ('timetable', 'fleet')},
+        'scenarios': results,
+    }
+
+
+def compare(result, baseline, threshold=0.1):
+    """Find scenarios which got slower or use more memory than the baseline.
+
+    Wall time is compared on the best day, which is the least sensitive to noise. Memory is compared
+    by tracemalloc, which counts the same allocations on every platform, not by peak RSS.
+    A baseline of another platform is not comparable, so nothing is compared against it.
+
+    :param result: dict returned by run_benchmark.
+    :param baseline: dict returned by run_benchmark for the baseline.
+    :param threshold: Relative growth reported as a regression. (ex: 0.1 for 10%)
+    :return: list of regression messages. Empty if there is no regression.
+    """
+    regressions = []
+    if baseline.get('platform') != result['platform']:
+        return regressions
+    for scenario, metrics in result['scenarios'].items():
+        if scenario not in baseline['scenarios']:
+            continue
+        for key in ('best_wall_time_per_day', 'traced_peak_bytes_per_passenger'):
+            before, after = baseline['scenarios'][scenario][key], metrics[key]
+            if after > before * (1 + threshold):
+                regressions.append(f'{scenario} {key}: {before:.4g} -> {after:.4g} (+{after / before - 1:.1%})')
+    return regressions
+
+
+if __name__ == '__main__':
+    scenarios = ['baseline', 'peak'] + [f'load{factor}' for factor in load_factors]
+    result = run_benchmark(scenarios, case, n_days, {'seed': seed, 'compact_queues': compact_queues})
+
+    print(f"{'scenario':<10}{'passengers':>12}{'s/day':>10}{'events/s':>12}{'RSS MB':>10}{'B/passenger':>13}"
+          f"{'GC s/day':>10}{'GC share':>10}")
+    for scenario, metrics in result['scenarios'].items():
+        rss = '-' if metrics['peak_rss_mb'] is None else f"{metrics['peak_rss_mb']:.1f}"
+        print(f"{scenario:<10}{metrics['passengers_per_day']:>12.0f}{metrics['wall_time_per_day']:>10.3f}"
+              f"{metrics['events_per_sec']:>12.0f}{rss:>10}"
+              f"{metrics['traced_peak_bytes_per_passenger']:>13.1f}"
+              f"{metrics['gc_seconds_per_day']:>10.4f}{metrics['gc_share']:>10.1%}")
+
+    os.makedirs(os.path.dirname(result_path), exist_ok=True)
+    with open(result_path, 'w') as f:
+        json.dump(result, f, indent=2)
+
+    if save_baseline or not os.path.exists(baseline_path):
+        with open(baseline_path, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f'baseline saved to {baseline_path}')
+    else:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        if baseline.get('platform') != result['platform']:
+            print(f"baseline {baseline_path} was measured on {baseline.get('platform')}, not compared")
+        else:
+            regressions = compare(result, baseline, regression_threshold)
+            for message in regressions:
+                print('regression: ' + message)
+            if regressions:
+                sys.exit(1)
+            print(f'no regression beyond {regression_threshold:.0%} of {baseline_path}')
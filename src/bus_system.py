@@ -1,11 +1,131 @@
 import simpy
 import math
+import random
 import numpy as np
-from random import normalvariate
+from online_stats import SUMMARY_KEYS, WaitingTimeStats, summarize
+from sampler import NormalSampler
+from timestamp_queue import TimestampQueue
 
 WAITING_LIMIT = 15  # Maximum waiting time of a passenger
 
 
+class RandomStreams:
+    """Seedable source of independent random number streams for DES simulation.
+
+    Every station, bus and the dispatcher draw from their own stream, named by a key.
+    A stream depends only on the seed and its key, so two simulations with the same seed see
+    the same passenger arrivals even if their timetables differ (common random numbers).
+
+    Attributes
+    ----------
+    seed : int
+        Seed shared by every stream.
+    buffered : bool
+        If True, streams are sampler.NormalSampler drawing numpy blocks instead of random.Random.
+
+    """
+    def __init__(self, seed, buffered=False):
+        """
+        :param seed: Seed shared by every stream.
+        :param buffered: If True, create buffered numpy streams.
+        """
+        self.seed = seed
+        self.buffered = buffered
+
+    def stream(self, key):
+        """Create the random number stream named key.
+
+        :param key: Name of the stream. (ex: 'S0/arrive', 'BUS 1')
+        :return: random.Random or sampler.NormalSampler seeded by (seed, key).
+        """
+        rng = random.Random(f'{self.seed}/{key}')
+        if self.buffered:
+            return NormalSampler(np.random.default_rng(rng.getrandbits(128)))
+        return rng
+
+
+class Counters:
+    """Cumulative counters of every station and bus of a simulation in shared numpy arrays.
+
+    Each station and bus owns one column, which it reads and writes through properties
+    (ex: Station.n_hr_psn_board, Bus.driving_time), so monitor summarizes a whole network
+    with a few array operations per hour instead of a loop over stations and buses.
+    Waiting times of the current hour are kept per station in hour_waiting, which monitor
+    summarizes and resets every hour.
+
+    Attributes
+    ----------
+    stations : numpy.ndarray
+        Station counters of shape [3, station]: boarded, got off and reneged.
+    buses : numpy.ndarray
+        Bus counters of shape [3, bus]: boarded passengers, driving time and driving distance.
+    hour_waiting : list[online_stats.WaitingTimeStats]
+        Waiting times of passengers who stopped waiting during the current hour, one per station.
+
+    """
+    BOARDED, DEPARTED, RENEGED = range(3)
+    USERS, DRIVING_TIME, DRIVING_DISTANCE = range(3)
+
+    def __init__(self, n_stations, n_buses):
+        """
+        :param n_stations: Number of stations.
+        :param n_buses: Number of buses.
+        """
+        self.stations = np.zeros((3, n_stations))
+        self.buses = np.zeros((3, n_buses))
+        self.hour_waiting = [WaitingTimeStats() for _ in range(n_stations)]
+
+
+def _counter(row):
+    """Property reading and writing one row of the Counters column of a station or bus."""
+    def get(self):
+        return self._counts[row]
+
+    def set(self, value):
+        self._counts[row] = value
+
+    return property(get, set)
+
+
+class Route:
+    """Route class for DES simulation.
+
+    Routes of a network share Station objects. Passengers wait at a station, not for a route,
+    so they board the first bus of any route which stops there.
+
+    Attributes
+    ----------
+    name : str
+        Name of a route. (ex: 'main')
+    stations : list
+        List of bus_system.Station in driving order. The last one is the terminal of this route.
+    distance : list[float]
+        Distance from previous station to each station of this route.
+    bus_iat : numpy.ndarray
+        Bus inter-arrival time distribution to each station of shape [zone, position, 2].
+    bus_iat_means : list[float]
+        Mean bus inter-arrival time to each station during current hour. Updated by dist_change every hour.
+    bus_iat_stds : list[float]
+        Standard deviation of bus inter-arrival time to each station during current hour.
+
+    """
+    __slots__ = ('name', 'stations', 'distance', 'bus_iat', 'bus_iat_means', 'bus_iat_stds')
+
+    def __init__(self, name, stations, distance, bus_iat):
+        """
+        :param name: Name of a route.
+        :param stations: List of stations in driving order.
+        :param distance: Distance from previous station to each station.
+        :param bus_iat: Bus inter-arrival time distribution of shape [zone, position, 2].
+        """
+        self.name = name
+        self.stations = stations
+        self.distance = [float(d) for d in distance]
+        self.bus_iat = bus_iat
+        self.bus_iat_means = bus_iat[0, :, 0].tolist()
+        self.bus_iat_stds = bus_iat[0, :, 1].tolist()
+
+
 class Bus:
     """Bus class for DES simulation.
 
@@ -21,120 +141,200 @@ class Bus:
         Fuel type which this bus uses. One of { 'CNG', 'H2' }
     model : str
         Model name of bus. (ex: 'New_Super_Aerocity')
-    cost : float
-        Daily operation cost including fuel cost
+    route : Route
+        Route which this bus drives.
     stations : list
-        List of bus_system.Station. Bus drives along these stations.
-    bus_idt_dist : numpy.ndarray
-        Normal distribution parameter for bus inter-dispatch time.
-        numpy.array([mean, std])
+        List of bus_system.Station. Bus drives along these stations. (stations of route)
+    bus_idt_mean : float
+        Mean bus inter-dispatch time during current hour.
+    bus_idt_std : float
+        Standard deviation of bus inter-dispatch time during current hour.
+    compact : bool
+        True if passengers are counted instead of stored as Passenger objects (compact queue mode).
+    capacity : int
+        Maximum number of passengers a bus can contain.
     passengers : simpy.store
-        FIFO queue modeled by simpy.Store class.
-        capacity is the maximum number of passengers a bus can contain.
+        FIFO queue modeled by simpy.Store class. Only used if compact is False.
+    load : int
+        Number of passengers in a bus. Only used if compact is True.
+    counters : Counters
+        Counters of the simulation. Column index of this bus in Counters.buses.
     board_cnt : int
-        Total number of passengers boarded on a bus.
+        Total number of passengers boarded on a bus. (stored in counters)
     leave_cnt : int
         Total number of passengers got off a bus.
     driving_time : float
-        Total bus driving time not including terminal to
+        Total bus driving time not including terminal to (stored in counters)
     driving_distance : float
-        Total bus driving distance.
+        Total bus driving distance. (stored in counters)
     driving_process : simpy.events.Process
         Simpy process which triggered when a bus is dispatched and starts driving.
     running : simpy.Resource
         Simpy basic resource to prevent error that a bus is dispatched before it even finishes driving.
+    dwell_time : float
+        Time a bus stays at a station per passenger who gets off or boards. (min/passenger)
+    rng : random.Random or sampler.NormalSampler
+        Random number stream for driving and dispatch times of a bus.
 
     """
-    def __init__(self, env, bus_info, stations):
+    __slots__ = ('env', 'name', 'category', 'fuel', 'model', 'route', 'stations', 'bus_idt_mean',
+                 'bus_idt_std', 'compact', 'capacity', 'passengers', 'load', 'counters', '_counts', 'leave_cnt',
+                 'driving_process', 'running', 'dwell_time', 'rng')
+    board_cnt = _counter(Counters.USERS)
+    driving_time = _counter(Counters.DRIVING_TIME)
+    driving_distance = _counter(Counters.DRIVING_DISTANCE)
+
+    def __init__(self, env, bus_info, route, streams=None, compact=False, dwell_time=0, counters=None, index=0):
         """
         :param env: simpy.Environment where a bus is created.
-        :param bus_info: pandas.Series which contains information for a bus
-        :param stations: list of stations which a bus drives
+        :param bus_info: dict or pandas.Series which contains information for a bus
+        :param route: Route which a bus drives
+        :param streams: RandomStreams of the simulation. If None, the global random module is used.
+        :param compact: If True, count passengers instead of storing them. Stations must be compact too.
+        :param dwell_time: Time a bus stays at a station per passenger who gets off or boards.
+        :param counters: Counters shared by the simulation. If None, the bus gets counters of its own.
+        :param index: Column of this bus in counters.buses.
         """
         self.env = env
         self.name = bus_info["name"]
         self.category = bus_info["category"]
         self.fuel = bus_info["fuel"]
         self.model = bus_info["model"]
-        self.cost = 0
-        self.stations = stations
-        self.bus_idt_dist = np.array([13.5, 2.475])
-        self.passengers = simpy.Store(self.env, capacity=bus_info["capacity"])
-        self.board_cnt = 0
+        self.route = route
+        self.stations = route.stations
+        self.bus_idt_mean = 13.5
+        self.bus_idt_std = 2.475
+        self.compact = compact
+        self.capacity = bus_info["capacity"]
+        self.passengers = None if compact else simpy.Store(self.env, capacity=self.capacity)
+        self.load = 0
+        self.counters = Counters(0, 1) if counters is None else counters
+        self._counts = self.counters.buses[:, index]
         self.leave_cnt = 0
-        self.driving_time = 0
-        self.driving_distance = 0
         self.driving_process = 0
         self.running = simpy.Resource(self.env, capacity=1)
+        self.dwell_time = dwell_time
+        self.rng = streams.stream(self.name) if streams else random
 
     def arrive(self, station):
         """Function called when a bus arrives at the station.
 
         When a bus arrives at the station, passengers in the bus get off first.
-        If the station is terminal, all passengers get off.
+        If the station is the terminal of its route, all passengers get off.
         Otherwise, the number of passengers getting off is determined by the station's departing queue length.
         After passengers in the bus get off, passengers in the station's boarding queue start boarding.
         If a bus is full, half of passengers in the boarding queue renege.
         Even if a bus is not full, passengers who waited more than WAITING_LIMIT minutes renege.
 
+        Every passenger is resolved in one computation at arrival time instead of one simpy event each.
+        Nothing waits on a simpy.Store of passengers, so their item lists are changed directly.
+
         :param station: Bus arrives at this station.
+        :return: Number of passengers who got off, including everyone left at the terminal, or boarded.
         """
+        if self.compact:
+            return self.arrive_compact(station)
+
         # bus arrives at a station, and passengers get off
-        temp_cnt = 0
-        if station.is_terminal:  # if bus arrived at terminal
-            for i in range(station.n_psn_depart):
-                if self.passengers.items:
-                    yield self.passengers.get()
-                    temp_cnt += 1
-
-            while self.passengers.items:
-                yield self.passengers.get()
-                self.leave_cnt += 1
-
-        else:
-            for i in range(station.n_psn_depart):
-                if self.passengers.items:
-                    yield self.passengers.get()
-                    temp_cnt += 1
-
-        station.n_hr_psn_depart += temp_cnt
+        station.count_departures()
+        on_board = self.passengers.items
+        n_leave = min(station.n_psn_depart, len(on_board))
+        del on_board[:n_leave]
+        n_terminal = 0
+        if station is self.stations[-1]:  # if bus arrived at terminal, everyone left gets off
+            n_terminal = len(on_board)
+            self.leave_cnt += n_terminal
+            on_board.clear()
+        station.n_hr_psn_depart += n_leave
         station.n_psn_depart = 0
-        temp_cnt = 0
+
         # after passengers get off, new passengers board
-        while station.boarding_queue.items:
-            if len(self.passengers.items) == self.passengers.capacity:  # if bus is full
-                current_len = len(station.boarding_queue.items)
-                while len(station.boarding_queue.items) > current_len / 2:
-                    passenger_renege = yield station.boarding_queue.get()  # half of passengers renege
-                    passenger_renege.end_waiting(self.env)
-                    passenger_renege.renege()
-                    station.psn_waiting_time.append(passenger_renege.waiting_time)
-                    station.n_psn_renege += 1
-
-                break  # forced while loop exit
-
-            else:  # if bus is not full
-                passenger_now = yield station.boarding_queue.get()
-                passenger_now.end_waiting(self.env)
-                if passenger_now.waiting_time > WAITING_LIMIT:  # passenger renege if waited too long
-                    passenger_now.renege()
-                    station.psn_waiting_time.append(WAITING_LIMIT)
-                    station.n_psn_renege += 1
-
-                else:
-                    station.psn_waiting_time.append(passenger_now.waiting_time)
-                    yield self.passengers.put(passenger_now)
-                    temp_cnt += 1
-                    self.board_cnt += 1
-
-        station.n_hr_psn_board += temp_cnt
+        queue = station.boarding_queue.items
+        n_board = 0
+        n_taken = 0
+        for passenger_now in queue:
+            if len(on_board) == self.capacity:  # if bus is full
+                break
+            n_taken += 1
+            passenger_now.end_waiting(self.env)
+            if passenger_now.waiting_time > WAITING_LIMIT:  # passenger renege if waited too long
+                passenger_now.renege()
+                station.record_waiting_time(WAITING_LIMIT)
+                station.n_psn_renege += 1
+
+            else:
+                station.record_waiting_time(passenger_now.waiting_time)
+                on_board.append(passenger_now)
+                n_board += 1
+        del queue[:n_taken]
+        self.board_cnt += n_board
+
+        if queue and len(on_board) == self.capacity:  # if bus is full, half of passengers renege
+            n_renege = len(queue) - len(queue) // 2
+            for passenger_renege in queue[:n_renege]:
+                passenger_renege.end_waiting(self.env)
+                passenger_renege.renege()
+                station.record_waiting_time(passenger_renege.waiting_time)
+            del queue[:n_renege]
+            station.n_psn_renege += n_renege
+
+        station.n_hr_psn_board += n_board
+        return n_leave + n_terminal + n_board
+
+    def arrive_compact(self, station):
+        """Function called when a bus arrives at the station in compact queue mode.
+
+        Same rules as arrive. Passengers getting off are subtracted from load, and boarding passengers
+        are taken from the station's queue of arrival timestamps in batches.
+        Queued timestamps are sorted, so passengers who waited more than WAITING_LIMIT minutes
+        are always at the head of the queue.
+
+        :param station: Bus arrives at this station.
+        :return: Number of passengers who got off, including everyone left at the terminal, or boarded.
+        """
+        # bus arrives at a station, and passengers get off
+        station.count_departures()
+        n_leave = min(station.n_psn_depart, self.load)
+        self.load -= n_leave
+        n_terminal = 0
+        if station is self.stations[-1]:  # if bus arrived at terminal, everyone left gets off
+            n_terminal = self.load
+            self.leave_cnt += n_terminal
+            self.load = 0
+        station.n_hr_psn_depart += n_leave
+        station.n_psn_depart = 0
+
+        # after passengers get off, new passengers board
+        now = self.env.now
+        queue = station.boarding_queue
+        n_board = 0
+        if self.load < self.capacity:
+            n_expired = queue.count_before(now - WAITING_LIMIT)  # passengers renege if waited too long
+            if n_expired:
+                queue.popleft(n_expired)
+                station.record_waiting_time(WAITING_LIMIT, n_expired)
+                station.n_psn_renege += n_expired
+
+            n_board = min(self.capacity - self.load, len(queue))
+            station.record_waiting_times([now - waiting_start for waiting_start in queue.popleft(n_board)])
+            self.load += n_board
+            self.board_cnt += n_board
+
+        if len(queue) and self.load == self.capacity:  # if bus is full, half of passengers renege
+            n_renege = len(queue) - len(queue) // 2
+            station.record_waiting_times([now - waiting_start for waiting_start in queue.popleft(n_renege)])
+            station.n_psn_renege += n_renege
+
+        station.n_hr_psn_board += n_board
+        return n_leave + n_terminal + n_board
 
     def drive(self):
         """Function called when a bus starts driving.
 
         First, validate if a bus is driving already. This is done by yielding a request in simpy resource.
         Then, a bus yields driving time to next station and add its driving time and distance
-        After yielding driving time, a bus arrives at a station by calling self.arrive function.
+        After yielding driving time, a bus arrives at a station by calling self.arrive function,
+        and stays there for dwell_time minutes per passenger who got off or boarded.
         After iterating driving and arriving process, a bus ends driving for a cycle and
         wait until next dispatch.
 
@@ -142,31 +342,22 @@ class Bus:
         with self.running.request() as req:
             yield req
 # 1         print(self.name + ' start driving at ' + str(self.env.now))
-            for station in self.stations:
-                driving_time_single = normalvariate(station.bus_iat_dist[0], station.bus_iat_dist[1])
+            route = self.route
+            for k, station in enumerate(self.stations):
+                driving_time_single = self.rng.normalvariate(route.bus_iat_means[k], route.bus_iat_stds[k])
                 yield self.env.timeout(driving_time_single)  # bus moves to next station
                 self.driving_time += driving_time_single
-                self.driving_distance += station.distance
-                yield self.env.process(self.arrive(station))  # bus arrives at station[i]
+                self.driving_distance += route.distance[k]
+                n_moved = self.arrive(station)  # bus arrives at station[i]
+                if self.dwell_time and n_moved:
+                    yield self.env.timeout(self.dwell_time * n_moved)
             # bus finishes driving for one cycle
 # 2         print(self.name + ' finish driving at ' + str(self.env.now))
-            real_dispatch_time = max(normalvariate(self.bus_idt_dist[0], self.bus_idt_dist[1])
-                                     - normalvariate(self.stations[0].bus_iat_dist[0],
-                                                     self.stations[0].bus_iat_dist[1]), 0)
+            real_dispatch_time = max(self.rng.normalvariate(self.bus_idt_mean, self.bus_idt_std)
+                                     - self.rng.normalvariate(route.bus_iat_means[0], route.bus_iat_stds[0]), 0)
             yield self.env.timeout(real_dispatch_time)
             # print(self.name + ' ready at ' + str(self.env.now))
 
-    def calculate_cost(self, bus_cost):
-        """Calculate operating cost including fuel cost of a bus.
-
-        :param bus_cost: pandas.DataFrame that contains bus cost information.
-        """
-        fuel_cost = bus_cost[self.fuel]
-        operation_cost = bus_cost['operational']
-        retain_cost = bus_cost['retain']
-        self.cost = int(fuel_cost * self.driving_distance + operation_cost + retain_cost)
-        # print(f'total bus cost: {total_bus_cost}')
-
     def dispatch(self):
         """Function called periodically to dispatch a bus.
 
@@ -187,81 +378,132 @@ class Station:
         Simpy environment where this station is created.
     name : str
         Name of a station. (ex: 'S0', 'S1')
-    distance : float
-        Distance from previous station to current station.
-    is_terminal : bool
-        True only if a station is terminal. False otherwise.
-    boarding_queue : simpy.Store
-        FIFO queue modeled by simpy.Store class. Assume infinite capacity.
-    psn_iat_dist : numpy.ndarray
-        Normal distribution parameters of passenger inter-arrival time.
-        numpy.array([mean, std])
-    psn_idt_dist : numpy.ndarray
-        Normal distribution parameters of passenger inter-departure time.
-        numpy.array([mean, std])
-    bus_iat_dist : numpy.ndarray
-        Normal distribution parameters of bus inter-arrival time.
-        numpy.array([mean, std])
+    compact : bool
+        True if waiting passengers are stored as arrival timestamps (compact queue mode).
+    boarding_queue : simpy.Store or timestamp_queue.TimestampQueue
+        FIFO queue of waiting passengers. Assume infinite capacity.
+        simpy.Store of Passenger, or TimestampQueue of arrival times if compact is True.
+    psn_iat_mean : float
+        Mean passenger inter-arrival time during current hour.
+    psn_iat_std : float
+        Standard deviation of passenger inter-arrival time during current hour.
+    psn_idt_mean : float
+        Mean passenger inter-departure time during current hour.
+    psn_idt_std : float
+        Standard deviation of passenger inter-departure time during current hour.
     n_psn_depart : int
-        Number of passengers in a station's departing queue.
+        Number of passengers in a station's departing queue. Up to date after count_departures.
+    next_departure : float
+        Time when the next passenger wants to get off at this station.
+    counters : Counters
+        Counters of the simulation. Column index of this station in Counters.stations.
     n_psn_renege : int
-        Total number of passengers reneged at a station.
+        Total number of passengers reneged at a station. (stored in counters)
     n_hr_psn_board: int
-        Number of passengers boarded at a station during one hour.
+        Total number of passengers boarded at a station. Monitor takes hourly differences. (stored in counters)
     n_hr_psn_depart: int
-        Number of passengers got off at a station during one hour.
-    psn_waiting_time: list[float]
-        List of waiting time of passengers.
+        Total number of passengers got off at a station. Monitor takes hourly differences. (stored in counters)
+    waiting_stats: online_stats.WaitingTimeStats
+        Streaming statistics of passenger waiting times during a day.
+    hour_waiting_stats: online_stats.WaitingTimeStats
+        Streaming statistics of passenger waiting times during the current hour. (shared with counters)
     arrival_process : simpy.events.Process
         Simpy process triggered when a station is initialized.
-    departure_process : simpy.events.Process
-        Simpy process triggered when a station is initialized.
+    arrival_rng : random.Random or sampler.NormalSampler
+        Random number stream for passenger inter-arrival times.
+    departure_rng : random.Random or sampler.NormalSampler
+        Random number stream for passenger inter-departure times.
 
     """
-    def __init__(self, env, name, distance):
+    __slots__ = ('env', 'name', 'compact', 'boarding_queue', 'psn_iat_mean', 'psn_iat_std', 'psn_idt_mean',
+                 'psn_idt_std', 'n_psn_depart', 'next_departure', 'counters', '_counts', 'waiting_stats',
+                 'hour_waiting_stats', 'arrival_process', 'arrival_rng', 'departure_rng')
+    n_psn_renege = _counter(Counters.RENEGED)
+    n_hr_psn_board = _counter(Counters.BOARDED)
+    n_hr_psn_depart = _counter(Counters.DEPARTED)
+
+    def __init__(self, env, name, streams=None, compact=False, counters=None, index=0):
         """
         :param env: simpy.Environment where a bus is created.
         :param name: Name of a station.
-        :param distance: Distance from previous station to current station.
+        :param streams: RandomStreams of the simulation. If None, the global random module is used.
+        :param compact: If True, store waiting passengers as arrival timestamps.
+        :param counters: Counters shared by the simulation. If None, the station gets counters of its own.
+        :param index: Column of this station in counters.stations.
         """
         self.env = env
         self.name = name
-        self.distance = distance  # distance 'to' current station
-        self.is_terminal = False
-        self.boarding_queue = simpy.Store(self.env)
-        self.psn_iat_dist = np.array([10, 0.01])
-        self.psn_idt_dist = np.array([10, 0.01])
-        self.bus_iat_dist = np.array([7, 0.1])
+        self.compact = compact
+        self.boarding_queue = TimestampQueue() if compact else simpy.Store(self.env)
+        self.psn_iat_mean, self.psn_iat_std = 10, 0.01
+        self.psn_idt_mean, self.psn_idt_std = 10, 0.01
         self.n_psn_depart = 0
-        self.n_psn_renege = 0
-        self.n_hr_psn_board = 0
-        self.n_hr_psn_depart = 0
-        self.psn_waiting_time = []
+        self.counters = Counters(1, 0) if counters is None else counters
+        self._counts = self.counters.stations[:, index]
+        self.waiting_stats = WaitingTimeStats()
+        self.hour_waiting_stats = self.counters.hour_waiting[index]
+        self.arrival_rng = streams.stream(self.name + '/arrive') if streams else random
+        self.departure_rng = streams.stream(self.name + '/depart') if streams else random
         self.arrival_process = self.env.process(self.passenger_arrive())
-        self.departure_process = self.env.process(self.passenger_depart())
+        self.next_departure = self.env.now + self.departure_rng.normalvariate(self.psn_idt_mean, self.psn_idt_std)
+
+    def record_waiting_time(self, waiting_time, n=1):
+        """Record waiting time of passengers who boarded or reneged at this station.
+
+        :param waiting_time: Waiting time in minutes.
+        :param n: Number of passengers who waited equally long.
+        """
+        self.waiting_stats.add(waiting_time, n)
+        self.hour_waiting_stats.add(waiting_time, n)
+
+    def record_waiting_times(self, waiting_times):
+        """Record waiting time of each passenger of a batch who boarded or reneged at this station.
+
+        :param waiting_times: List of waiting times in minutes.
+        """
+        self.waiting_stats.add_all(waiting_times)
+        self.hour_waiting_stats.add_all(waiting_times)
 
     def passenger_arrive(self):
         """Yield passenger IAT, generate passengers and put them in boarding queue continuously.
 
         """
+        env = self.env
+        normalvariate = self.arrival_rng.normalvariate
+        queue = self.boarding_queue if self.compact else self.boarding_queue.items
         cnt = 0
         while True:
-            yield self.env.timeout(normalvariate(self.psn_iat_dist[0], self.psn_iat_dist[1]))
+            yield env.timeout(normalvariate(self.psn_iat_mean, self.psn_iat_std))
             # new passenger arrives at this station
-            psn_code = 'P' + str(cnt).zfill(3)
-            passenger = Passenger(self.name + psn_code)
-            passenger.start_waiting(self.env)
-            yield self.boarding_queue.put(passenger)
+            if self.compact:
+                queue.append(env.now)
+                continue
+            # nothing waits on the store, so the passenger joins its item list without a put event
+            passenger = Passenger(self, cnt)
+            passenger.start_waiting(env)
+            queue.append(passenger)
             cnt += 1
 
-    def passenger_depart(self):
-        """Yield passenger IDT and put them in departing queue continuously.
+    def count_departures(self):
+        """Add passengers who wanted to get off by now to the departing queue.
 
+        Departing passengers only matter when a bus arrives, so instead of a simpy process
+        with one timeout per passenger, inter-departure times are drawn here in one batch
+        when a bus arrives or the hourly distribution changes. Every time is drawn from the
+        distribution in effect when the previous passenger came, as the process did.
         """
-        while True:
-            yield self.env.timeout(normalvariate(self.psn_idt_dist[0], self.psn_idt_dist[1]))
-            # new passenger wants to get off at this station
-            self.n_psn_depart += 1
+        now = self.env.now
+        next_departure = self.next_departure
+        if next_departure > now:
+            return
+        mean, std = self.psn_idt_mean, self.psn_idt_std
+        normalvariate = self.departure_rng.normalvariate
+        n_depart = 0
+        while next_departure <= now:
+            n_depart += 1
+            next_departure += normalvariate(mean, std)
+        self.n_psn_depart += n_depart
+        self.next_departure = next_departure
 
 
 class Passenger:
@@ -274,8 +516,12 @@ class Passenger:
 
     Attributes
     ----------
+    station : Station
+        Station where a passenger arrived.
+    number : int
+        Arrival order of a passenger at its station, from 0.
     name : str
-        Passenger name. (for example, S2P013 means 13th passenger who arrived at station 2)
+        Passenger name, made only when read. (for example, S2P013 means 13th passenger who arrived at station 2)
     waiting_start : float
         When a passenger started waiting in boarding queue.
     waiting_end : float
@@ -289,16 +535,24 @@ class Passenger:
     reneged : bool
         True if a passenger reneged.
     """
-    def __init__(self, name):
+    __slots__ = ('station', 'number', 'waiting_start', 'waiting_end', 'waiting_time', 'reneged')
+
+    def __init__(self, station, number):
         """
-        :param name: Name of passenger
+        :param station: Station where a passenger arrived.
+        :param number: Arrival order of a passenger at its station.
         """
-        self.name = name
+        self.station = station
+        self.number = number
         self.waiting_start = 0
         self.waiting_end = 0
         self.waiting_time = 0
         self.reneged = False
 
+    @property
+    def name(self):
+        return f'{self.station.name}P{self.number:03d}'
+
     def start_waiting(self, env):
         """Passenger start waiting for a bus.
 
@@ -320,103 +574,108 @@ class Passenger:
         self.reneged = True
 
 
-def dispatch_buses(env, bus_idt_df, buses):
+def dispatch_buses(env, bus_idt, buses, rng=random, cyclic=False):
     """Yield bus IDT time and dispatch buses continuously.
 
     :param env: simpy.Environment where simulation takes place.
-    :param bus_idt_df: pandas.DataFrame which contains information for bus IDT.
+    :param bus_idt: numpy.ndarray of bus IDT distribution of shape [zone, 2]. (ex: ParamTables.bus_idt[case])
     :param buses: List of buses.
+    :param rng: Random number stream for bus IDT. (ex: RandomStreams.stream('dispatcher'))
+    :param cyclic: If True, time zones repeat every day. Otherwise the last zone lasts until the end.
     """
+    bus_idt_dists = bus_idt.tolist()
+    n_zones = len(bus_idt_dists)
     while True:
         for bus in buses:
-            j = min(math.floor(env.now / 60), len(bus_idt_df)-1)
+            j = math.floor(env.now / 60)
+            j = j % n_zones if cyclic else min(j, n_zones - 1)
             bus.dispatch()
-            yield env.timeout(normalvariate(bus_idt_df.iloc[j, 0], bus_idt_df.iloc[j, 1]))
+            yield env.timeout(rng.normalvariate(*bus_idt_dists[j]))
 
 
-def dist_change(env, stations, buses, df_list):
+def dist_change(env, stations, routes, buses, tables, bus_idt, passenger_tables=None):
     """Change time distribution of passengers and buses every hour during simulation.
 
     :param env: simpy.Environment where simulation takes place.
     :param stations: List of stations.
+    :param routes: List of routes.
     :param buses: List of buses.
-    :param df_list: List of pandas.Dataframe which contains time distribution of passengers and buses.
+    :param tables: param_tables.ParamTables which contains time distribution of passengers and buses.
+    :param bus_idt: numpy.ndarray of bus IDT distribution of shape [zone, 2]. (ex: ParamTables.bus_idt[case])
+    :param passenger_tables: Function of day index returning (psn_iat, psn_idt) arrays of that day,
+        for days with different passenger profiles. If None, every day uses tables.psn_iat and tables.psn_idt.
     """
-    time_zone = 18
-    psn_iat_df, psn_idt_df, bus_iat_df, bus_idt_df = df_list
+    # parameters are converted to python floats once, so no array is created every hour
+    bus_idt = bus_idt.tolist()
+    route_tables = [(route.bus_iat[:, :, 0].tolist(), route.bus_iat[:, :, 1].tolist()) for route in routes]
+    day = 0
     while True:
-        for j in range(time_zone):
-            for i, station in enumerate(stations):
-                station.psn_iat_dist = np.array([psn_iat_df.iloc[i, j + 1], 0.01])
-                station.psn_idt_dist = np.array([psn_idt_df.iloc[i, j + 1], 0.01])
-                station.bus_iat_dist = np.array([bus_iat_df.iloc[i, j + 1], 0.1])
+        psn_iat, psn_idt = (tables.psn_iat, tables.psn_idt) if passenger_tables is None else passenger_tables(day)
+        psn_iat, psn_idt = psn_iat.tolist(), psn_idt.tolist()
+        for j in range(tables.n_zones):
+            for station, iat, idt in zip(stations, psn_iat[j], psn_idt[j]):
+                station.count_departures()  # passengers before this hour follow the previous distribution
+                station.psn_iat_mean, station.psn_iat_std = iat
+                station.psn_idt_mean, station.psn_idt_std = idt
+
+            for route, (means, stds) in zip(routes, route_tables):
+                route.bus_iat_means = means[j]
+                route.bus_iat_stds = stds[j]
 
             for bus in buses:
-                bus.bus_idt_dist = np.array([bus_idt_df.iloc[j, 0], bus_idt_df.iloc[j, 1]])
+                bus.bus_idt_mean, bus.bus_idt_std = bus_idt[j]
 
             yield env.timeout(60)
+        day += 1
+
 
+def monitor(env, counters, hour_summaries, flush=None, waiting_summaries=None):
+    """Write hourly differences of counters into preallocated summary arrays every hour.
 
-def monitor(env, stations, buses, hour_summaries):
-    """Calculate statistics every hour and append them to list.
+    Waiting time of each hour is the average of passengers who stopped waiting during that hour.
+    Every snapshot is a few vectorized operations over all stations and buses at once.
 
     :param env: simpy.Environment where simulation takes place.
-    :param stations: List of stations.
-    :param buses: List of buses.
-    :param hour_summaries: List of hourly summarized data.
+    :param counters: Counters of every station and bus.
+    :param hour_summaries: List of 7 arrays of shape [hour, station or bus], filled row by row:
+        board, depart, renege and wait per station, bus users, drive time and drive distance per bus.
+    :param flush: Function called with hour_summaries whenever they are full, after which they are
+        filled again from the first row. If None, monitor stops once they are full.
+    :param waiting_summaries: Array of shape [hour, station, len(online_stats.SUMMARY_KEYS)] filled with
+        waiting time statistics of each station and hour (count, mean, std, min, max and quantiles),
+        or None.
     """
-
-    prev_board = np.zeros(20)
-    prev_depart = np.zeros(20)
-    prev_renege = np.zeros(20)
-    prev_cnt = np.zeros(20)
-    prev_time = np.zeros(20)
-    prev_distance = np.zeros(20)
+    stations = counters.stations
+    buses = counters.buses
+    prev_stations = np.zeros_like(stations)
+    mean = SUMMARY_KEYS.index('mean')
+    prev_buses = np.zeros_like(buses)
+    n_hours = len(hour_summaries[0])
+    hour = 0
     while True:
         yield env.timeout(60)
-        psn_board_col = []
-        psn_depart_col = []
-        psn_renege_col = []
-        psn_cnt_col = []
-        driving_time_col = []
-        driving_distance_col = []
-        waiting_times_col = []
-        for i, station in enumerate(stations):
-            if len(station.psn_waiting_time) > 0:
-                average_waiting_time = sum(station.psn_waiting_time) / len(station.psn_waiting_time)
-            else:
-                average_waiting_time = 0
-
-            psn_board = station.n_hr_psn_board - prev_board[i]
-            psn_depart = station.n_hr_psn_depart - prev_depart[i]
-            psn_renege = station.n_psn_renege - prev_renege[i]
-
-            psn_board_col.append(psn_board)
-            psn_depart_col.append(psn_depart)
-            psn_renege_col.append(psn_renege)
-            waiting_times_col.append(average_waiting_time)
-
-            prev_board[i] += psn_board
-            prev_depart[i] += psn_depart
-            prev_renege[i] += psn_renege
-
-        for i, bus in enumerate(buses):
-            psn_cnt = bus.board_cnt - prev_cnt[i]
-            driving_time = bus.driving_time - prev_time[i]
-            driving_distance = bus.driving_distance - prev_distance[i]
-
-            psn_cnt_col.append(psn_cnt)
-            driving_time_col.append(driving_time)
-            driving_distance_col.append(driving_distance)
-
-            prev_cnt[i] += psn_cnt
-            prev_time[i] += driving_time
-            prev_distance[i] += driving_distance
-
-        hour_summaries[0].append(psn_board_col)
-        hour_summaries[1].append(psn_depart_col)
-        hour_summaries[2].append(psn_renege_col)
-        hour_summaries[3].append(waiting_times_col)
-        hour_summaries[4].append(psn_cnt_col)
-        hour_summaries[5].append(driving_time_col)
-        hour_summaries[6].append(driving_distance_col)
+        station_counts = stations - prev_stations
+        bus_counts = buses - prev_buses
+        prev_stations[:] = stations
+        prev_buses[:] = buses
+
+        waiting_summary = summarize(counters.hour_waiting)
+        for stats in counters.hour_waiting:
+            stats.reset()
+        if waiting_summaries is not None:
+            waiting_summaries[hour] = waiting_summary
+
+        hour_summaries[0][hour] = station_counts[Counters.BOARDED]
+        hour_summaries[1][hour] = station_counts[Counters.DEPARTED]
+        hour_summaries[2][hour] = station_counts[Counters.RENEGED]
+        hour_summaries[3][hour] = waiting_summary[:, mean]
+        hour_summaries[4][hour] = bus_counts[Counters.USERS]
+        hour_summaries[5][hour] = bus_counts[Counters.DRIVING_TIME]
+        hour_summaries[6][hour] = bus_counts[Counters.DRIVING_DISTANCE]
+
+        hour += 1
+        if hour == n_hours:
+            if flush is None:
+                return
+            flush(hour_summaries)
+            hour = 0
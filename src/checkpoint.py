@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+
+import bus_system
+from result_cache import code_digest, input_digest
+from sweep import simulation_options
+
+
+class Checkpoint:
+    """Results of finished replications of a run on disk, so an interrupted run resumes where it stopped.
+
+    Every replication is written to its own pickle file as soon as it finishes, through a temporary
+    file and os.replace, so a crash leaves either the whole replication or nothing. A run which
+    finishes clears its checkpoint, so only an interrupted run leaves replications to resume.
+    The directory belongs to one run setting: the simulation code (see result_cache.code_digest),
+    input tables, every case's headways, the fleet, WAITING_LIMIT and every option including costs.
+    Replications saved under another setting are deleted when the checkpoint is opened.
+
+    Attributes
+    ----------
+    directory : str
+        Directory of replication files.
+    run_digest : str
+        Hex digest of the run setting.
+
+    """
+    def __init__(self, directory, inputs, options):
+        """
+        :param directory: Directory of replication files. Created if missing.
+        :param inputs: dict returned by sweep.load_inputs.
+        :param options: dict of simulation options of the run.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        tables = inputs['tables']
+        options = simulation_options(options)
+        digest = hashlib.sha256(code_digest() + input_digest(tables))
+        digest.update(np.ascontiguousarray(tables.bus_idt, dtype=float).tobytes())
+        settings = {'fleet': tables.bus_info, 'waiting_limit': bus_system.WAITING_LIMIT, **options}
+        digest.update(json.dumps(settings, sort_keys=True, default=str).encode())
+        self.run_digest = digest.hexdigest()
+
+        run_path = os.path.join(directory, 'run.json')
+        try:
+            with open(run_path) as f:
+                previous_digest = json.load(f)['run_digest']
+        except (OSError, ValueError, KeyError):
+            previous_digest = None
+        if previous_digest != self.run_digest:
+            self.clear()
+            with open(run_path + '.tmp', 'w') as f:
+                json.dump({'run_digest': self.run_digest}, f)
+            os.replace(run_path + '.tmp', run_path)
+
+    def _path(self, case, day):
+        return os.path.join(self.directory, f'case{case:04d}_day{day:05d}.pkl')
+
+    def save(self, daily_result):
+        """Write a finished replication.
+
+        :param daily_result: dict returned by sweep.simulate_day.
+        """
+        path = self._path(daily_result['case'], daily_result['day'])
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(daily_result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+
+    def load(self):
+        """Read every saved replication. Unreadable files are skipped and simulated again.
+
+        :return: dict of sweep.simulate_day results keyed by (case, day).
+        """
+        results = {}
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.pkl'):
+                continue
+            try:
+                with open(entry.path, 'rb') as f:
+                    daily_result = pickle.load(f)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                continue
+            results[daily_result['case'], daily_result['day']] = daily_result
+        return results
+
+    def clear(self):
+        """Delete every saved replication, and temporary files of interrupted writes."""
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(('.pkl', '.tmp')):
+                os.remove(entry.path)
@@ -0,0 +1,208 @@
+import glob
+import os
+
+import numpy as np
+import simpy
+
+from bus_system import RandomStreams, monitor
+from economics import ECONOMIC_KEYS, CostModel
+from online_stats import WaitingTimeStats
+from result_store import METRICS, STATION_METRICS
+from sweep import (DEFAULT_OPTIONS, build_network, load_inputs, load_passenger_profiles, replication_seed,
+                   simulation_options)
+
+# Global Variables -------------------
+n_days = 28  # days simulated in one environment
+case = 0  # timetable case (0-based)
+seed = 0
+week_profiles = ['passenger_data'] * 5 + ['before_corona'] * 2  # passenger data folder of each day of the week
+chunk_days = 7  # days of hourly results written per file
+output_dir = 'output/continuous'
+# ------------------------------------
+
+DAILY_KEYS = ['passengers', 'renege', 'total_waiting_time'] + ECONOMIC_KEYS
+
+
+class ChunkWriter:
+    """Buffer of hourly and daily results of a continuous simulation, written to disk every chunk_days days.
+
+    Only one chunk is held in memory, so memory does not grow with the number of simulated days.
+    Every chunk is one .npz file named by its first day, written to a temporary file first
+    so a chunk on disk is always complete.
+
+    Attributes
+    ----------
+    directory : str
+        Directory of chunk files.
+    chunk_days : int
+        Number of days per chunk.
+    hourly : dict[str, numpy.ndarray]
+        Hourly summaries of the current chunk keyed by metric name, of shape [day, hour, station or bus].
+    daily : dict[str, numpy.ndarray]
+        Daily statistics of the current chunk keyed by DAILY_KEYS, of shape [day].
+    driving_distance : numpy.ndarray
+        Daily driving distance per bus of the current chunk, of shape [day, bus].
+    profiles : list[str]
+        Passenger profile of each day of the current chunk.
+    first_day : int
+        Day index of the first day of the current chunk.
+    n_buffered : int
+        Number of days in the current chunk.
+
+    """
+    def __init__(self, directory, chunk_days, n_hours, n_stations, n_buses):
+        """
+        :param directory: Directory of chunk files. Created if missing, and chunks of a previous run are deleted.
+        :param chunk_days: Number of days per chunk.
+        :param n_hours: Number of hourly summaries per day.
+        :param n_stations: Number of stations.
+        :param n_buses: Number of buses.
+        """
+        self.directory = directory
+        self.chunk_days = chunk_days
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, 'chunk_*.npz')):
+            os.remove(path)
+        self.hourly = {metric: np.zeros((chunk_days, n_hours, n_stations if metric in STATION_METRICS else n_buses))
+                       for metric in METRICS}
+        self.daily = {key: np.zeros(chunk_days) for key in DAILY_KEYS}
+        self.driving_distance = np.zeros((chunk_days, n_buses))
+        self.profiles = []
+        self.first_day = 0
+        self.n_buffered = 0
+
+    def append(self, hour_summaries, daily, driving_distance, profile):
+        """Buffer one day, and write the chunk once it is full.
+
+        :param hour_summaries: List of 7 arrays of shape [hour, station or bus]. (see bus_system.monitor)
+        :param daily: dict of daily statistics keyed by DAILY_KEYS.
+        :param driving_distance: Driving distance per bus of the day.
+        :param profile: Passenger profile of the day.
+        """
+        i = self.n_buffered
+        for metric, summary in zip(METRICS, hour_summaries):
+            self.hourly[metric][i] = summary
+        for key in DAILY_KEYS:
+            self.daily[key][i] = daily[key]
+        self.driving_distance[i] = driving_distance
+        self.profiles.append(profile)
+        self.n_buffered += 1
+        if self.n_buffered == self.chunk_days:
+            self.flush()
+
+    def flush(self):
+        """Write buffered days to a chunk file and empty the buffer."""
+        n = self.n_buffered
+        if n == 0:
+            return
+        path = os.path.join(self.directory, f'chunk_{self.first_day:06d}.npz')
+        with open(path + '.tmp', 'wb') as f:
+            np.savez_compressed(f, day=np.arange(self.first_day, self.first_day + n),
+                                profile=np.array(self.profiles), driving_distance=self.driving_distance[:n],
+                                **{metric: array[:n] for metric, array in self.hourly.items()},
+                                **{'daily_' + key: array[:n] for key, array in self.daily.items()})
+        os.replace(path + '.tmp', path)
+        self.first_day += n
+        self.n_buffered = 0
+        self.profiles = []
+
+
+def load_chunks(directory, metrics=None):
+    """Read chunks of a continuous simulation into arrays over every day.
+
+    :param directory: Directory of chunk files.
+    :param metrics: Hourly metrics to read. (ex: ['board', 'renege']) Default reads every metric.
+    :return: dict of arrays of shape [day, ...] keyed by 'day', 'profile', 'driving_distance',
+        hourly metric names and 'daily_' + DAILY_KEYS.
+    """
+    metrics = METRICS if metrics is None else metrics
+    keys = ['day', 'profile', 'driving_distance'] + list(metrics) + ['daily_' + key for key in DAILY_KEYS]
+    columns = {key: [] for key in keys}
+    for path in sorted(glob.glob(os.path.join(directory, 'chunk_*.npz'))):
+        with np.load(path) as chunk:
+            for key in keys:
+                columns[key].append(chunk[key])
+    return {key: np.concatenate(arrays) if arrays else np.zeros(0) for key, arrays in columns.items()}
+
+
+def run_continuous(inputs, case, n_days, options, week_profiles=None, output_dir='output/continuous',
+                   chunk_days=7):
+    """Simulate n_days of one timetable case in a single environment, streaming results to disk.
+
+    Days follow each other without the night, so day d covers [d, d + 1) * 60 * n_zones minutes
+    of simulation time. Passengers still waiting and buses still driving at the end of a day carry over
+    to the next morning. Day d takes passenger distributions of week_profiles[d % len(week_profiles)].
+    Only running totals and one chunk of hourly results are kept in memory.
+
+    :param inputs: dict returned by sweep.load_inputs.
+    :param case: Case index (0-based).
+    :param n_days: Number of days.
+    :param options: dict of simulation options. Missing keys take values of sweep.DEFAULT_OPTIONS.
+    :param week_profiles: List of passenger data folders, one per day of the week.
+        Default uses the tables of inputs every day.
+    :param output_dir: Directory of chunk files. (see ChunkWriter)
+    :param chunk_days: Number of days per chunk file.
+    :return: dict of totals over every day: days, passengers, renege, total_waiting_time and
+        ECONOMIC_KEYS, and waiting_summary of every passenger.
+    """
+    options = simulation_options(options)
+    tables = inputs['tables']
+    if week_profiles is None:
+        profiles = {'': (tables.psn_iat, tables.psn_idt)}
+        week_profiles = ['']
+    else:
+        profiles = load_passenger_profiles(week_profiles, tables)
+
+    def day_profile(day):
+        return week_profiles[day % len(week_profiles)]
+
+    env = simpy.Environment()
+    streams = RandomStreams(replication_seed(options['seed'], case, 0, options['common_random_numbers']),
+                            buffered=options['buffered_sampling'])
+    stations, buses, counters = build_network(env, inputs, case, options, streams,
+                                              lambda day: profiles[day_profile(day)], cyclic=True)
+    cost_model = CostModel.from_inputs(inputs, options)
+    categories, fuels = [bus.category for bus in buses], [bus.fuel for bus in buses]
+    writer = ChunkWriter(output_dir, chunk_days, tables.n_zones, tables.n_stations, len(buses))
+
+    totals = dict.fromkeys(DAILY_KEYS, 0.0)
+    state = {'day': 0, 'waiting_time': 0.0}
+
+    def end_day(hour_summaries):
+        board, depart, renege, wait, bus_users, drive_time, drive_distance = hour_summaries
+        total_waiting_time = sum(station.waiting_stats.total for station in stations)
+        daily = {'passengers': bus_users.sum(), 'renege': renege.sum(),
+                 'total_waiting_time': total_waiting_time - state['waiting_time']}
+        driving_distance = drive_distance.sum(axis=0)
+        priced = cost_model.price(daily['passengers'], daily['total_waiting_time'],
+                                  cost_model.bus_cost(driving_distance, categories, fuels).sum())
+        daily.update({key: float(value) for key, value in priced.items()})
+        writer.append(hour_summaries, daily, driving_distance, day_profile(state['day']))
+        for key in DAILY_KEYS:
+            totals[key] += daily[key]
+        state['day'] += 1
+        state['waiting_time'] = total_waiting_time
+
+    hour_summaries = [np.zeros((tables.n_zones, tables.n_stations)) for _ in range(4)] \
+        + [np.zeros((tables.n_zones, len(buses))) for _ in range(3)]
+    env.process(monitor(env, counters, hour_summaries, end_day))
+    env.run(until=60 * tables.n_zones * n_days + 1)
+    writer.flush()
+    totals['waiting_time'] = totals['total_waiting_time'] / totals['passengers'] if totals['passengers'] else 0
+
+    waiting_stats = WaitingTimeStats()
+    for station in stations:
+        waiting_stats.merge(station.waiting_stats)
+    return {'days': state['day'], **totals, 'waiting_summary': waiting_stats.summary()}
+
+
+if __name__ == '__main__':
+    inputs = load_inputs()
+    result = run_continuous(inputs, case, n_days, {**DEFAULT_OPTIONS, 'seed': seed}, week_profiles,
+                            output_dir, chunk_days)
+    days = result['days']
+    print(f"{days} days of case {case + 1} written to {output_dir}")
+    print(f"average daily profit: {result['profit'] / days} won")
+    print(f"average waiting time: {result['waiting_summary']['mean']} minutes")
+    print(f"average daily renege: {result['renege'] / days}")
+    print(f"average daily net profit: {result['net_profit'] / days} won")
@@ -0,0 +1,124 @@
+import numpy as np
+
+ECONOMIC_KEYS = ['fee', 'bus_cost', 'profit', 'waiting_time', 'waiting_cost_waste', 'net_profit']
+
+
+def fee_per_passenger(age_fee_df, discount):
+    """Average fee paid by a passenger, weighted by age distribution.
+
+    :param age_fee_df: pandas.DataFrame of age_ratio_and_fee.csv
+    :param discount: Discount factor applied to passenger fees.
+    """
+    ratio_fee = age_fee_df.to_numpy(dtype=float)
+    return float((ratio_fee[0] * ratio_fee[1]).sum() * discount)
+
+
+class CostModel:
+    """Fares and bus operating costs compiled once, to price any number of simulated days at once.
+
+    Every passenger pays fee_per_passenger. A bus costs its fuel cost per km times its driving
+    distance plus fixed daily operational and retain costs, truncated to whole won per bus.
+    Medium buses use costs_small.csv, every other category costs_large.csv.
+    Waiting time is valued at cost_per_minute.
+
+    Attributes
+    ----------
+    fee_per_passenger : float
+        Average fee paid by a passenger after discount (won).
+    cost_per_minute : float
+        Time value of one minute of passenger waiting (won/min).
+
+    """
+    def __init__(self, age_fee_df, large_bus_cost_df, small_bus_cost_df, discount=0.8, cost_per_minute=66.8379):
+        """
+        :param age_fee_df: pandas.DataFrame of age_ratio_and_fee.csv
+        :param large_bus_cost_df: pandas.DataFrame of costs_large.csv
+        :param small_bus_cost_df: pandas.DataFrame of costs_small.csv
+        :param discount: Discount factor applied to passenger fees.
+        :param cost_per_minute: Time value of one minute of passenger waiting.
+        """
+        self.fee_per_passenger = fee_per_passenger(age_fee_df, discount)
+        self.cost_per_minute = cost_per_minute
+        self._cost_rows = {'large': large_bus_cost_df.iloc[0], 'medium': small_bus_cost_df.iloc[0]}
+        self._rates = {}  # (category, fuel) -> (fuel cost per km, operational cost, retain cost)
+
+    @classmethod
+    def from_inputs(cls, inputs, options):
+        """CostModel of the cost tables of sweep.load_inputs and discount, cost_per_minute of options."""
+        return cls(inputs['age_fee'], inputs['large_bus_cost'], inputs['small_bus_cost'],
+                   options['discount'], options['cost_per_minute'])
+
+    def bus_rates(self, categories, fuels):
+        """Cost rates of buses.
+
+        :param categories: Sequence of bus categories. (ex: 'large', 'medium')
+        :param fuels: Sequence of bus fuel types. (ex: 'CNG')
+        :return: (fuel cost per km, operational cost, retain cost), arrays of shape [bus].
+        """
+        keys = list(zip(categories, fuels))
+        for category, fuel in set(keys) - self._rates.keys():
+            row = self._cost_rows['medium' if category == 'medium' else 'large']
+            self._rates[category, fuel] = (float(row[fuel]), float(row['operational']), float(row['retain']))
+        return np.array([self._rates[key] for key in keys], dtype=float).reshape(-1, 3).T
+
+    def bus_cost(self, driving_distance, categories, fuels):
+        """Daily operating cost of buses.
+
+        :param driving_distance: Array of daily driving distances whose last axis is bus.
+        :param categories: Sequence of bus categories, one per bus.
+        :param fuels: Sequence of bus fuel types, one per bus.
+        :return: numpy.ndarray of costs in the shape of driving_distance.
+        """
+        per_km, operational, retain = self.bus_rates(categories, fuels)
+        return np.trunc(per_km * np.asarray(driving_distance, dtype=float) + operational + retain)
+
+    def price(self, passengers, total_waiting_time, bus_cost):
+        """Fee, profit and waiting cost of days, elementwise over arrays of days.
+
+        :param passengers: Passengers boarded per day.
+        :param total_waiting_time: Total passenger waiting time per day (min).
+        :param bus_cost: Operating cost of the whole fleet per day.
+        :return: dict of arrays keyed by ECONOMIC_KEYS.
+        """
+        passengers = np.asarray(passengers, dtype=float)
+        total_waiting_time = np.asarray(total_waiting_time, dtype=float)
+        bus_cost = np.asarray(bus_cost, dtype=float)
+        fee = passengers * self.fee_per_passenger
+        profit = fee - bus_cost
+        waiting_cost_waste = total_waiting_time * self.cost_per_minute
+        with np.errstate(divide='ignore', invalid='ignore'):
+            waiting_time = total_waiting_time / passengers
+        return {
+            'fee': fee,
+            'bus_cost': bus_cost,
+            'profit': profit,
+            'waiting_time': waiting_time,
+            'waiting_cost_waste': waiting_cost_waste,
+            'net_profit': profit - waiting_cost_waste,
+        }
+
+    def price_operations(self, operations):
+        """Price simulated days, which may have fleets of different sizes, in one array operation.
+
+        :param operations: List of dicts returned by sweep.operate_day. (ex: cached days)
+        :return: dict of arrays of shape [day] keyed by ECONOMIC_KEYS, in order of operations.
+        """
+        buses = [bus for operation in operations for bus in operation['buses']]
+        owner = np.repeat(np.arange(len(operations)), [len(operation['buses']) for operation in operations])
+        costs = self.bus_cost([bus['driving_distance'] for bus in buses],
+                              [bus['category'] for bus in buses], [bus['fuel'] for bus in buses])
+        return self.price([operation['passengers'] for operation in operations],
+                          [operation['total_waiting_time'] for operation in operations],
+                          np.bincount(owner, weights=costs, minlength=len(operations)))
+
+    def price_store(self, store, fleet):
+        """Price every recorded replication of a result_store.ResultStore.
+
+        :param store: ResultStore with daily passengers, total waiting time and bus driving distances.
+        :param fleet: List of bus_info dicts of the buses in the store. (ex: ParamTables.bus_info)
+        :return: dict of arrays of shape [case, day] keyed by ECONOMIC_KEYS. Unrecorded days are NaN.
+        """
+        costs = self.bus_cost(store.driving_distance, [info['category'] for info in fleet],
+                              [info['fuel'] for info in fleet]).sum(axis=-1)
+        priced = self.price(store.daily['passengers'], store.daily['total_waiting_time'], costs)
+        return {key: np.where(store.recorded, values, np.nan) for key, values in priced.items()}
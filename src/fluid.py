@@ -0,0 +1,109 @@
+import numpy as np
+
+from bus_system import WAITING_LIMIT
+from economics import CostModel
+
+
+def estimate_case(inputs, case, options):
+    """Estimate one day of a timetable case with a deterministic fluid model instead of DES.
+
+    Every hour, buses of each route are assumed to arrive at each of its stations exactly once per
+    effective headway. The effective headway is the scheduled one, unless the route's fleet cannot
+    drive a cycle that often. Stations shared by several routes see buses of any of them.
+    Passengers arrive uniformly between two buses. At each visit, the bus load goes down by the
+    expected alighting requests and up by boarding passengers, until the bus is full. Passengers
+    who waited longer than WAITING_LIMIT renege, and half of those left behind by a full bus renege
+    while the other half wait for the next bus, as in bus_system.Bus.arrive.
+    Revenue and bus operating cost follow the same cost model as the simulation.
+
+    :param inputs: dict returned by sweep.load_inputs.
+    :param case: Case index (0-based).
+    :param options: dict of simulation options. (see sweep.DEFAULT_OPTIONS)
+    :return: dict of estimated daily statistics like sweep.simulate_day, and hourly arrays
+        of shape [zone, station] keyed by 'hourly_board', 'hourly_renege' and 'hourly_wait'.
+    """
+    tables = inputs['tables']
+    cost_model = CostModel.from_inputs(inputs, options)
+    arrival_rate = 1 / tables.psn_iat[:, :, 0]  # passengers per minute [zone, station]
+    depart_rate = 1 / tables.psn_idt[:, :, 0]
+    scheduled = tables.bus_idt[case, :, 0]
+
+    # effective headway of each route driven by its own fleet
+    routes = []
+    for route in tables.routes:
+        fleet = [info for info in tables.bus_info if info['route'] == route['name']]
+        if not fleet:
+            continue
+        route_time = route['bus_iat'][:, :, 0].sum(axis=1)  # [zone]
+        cycle_time = route_time + np.maximum(scheduled - route['bus_iat'][:, 0, 0], 0)
+        routes.append((route, fleet, np.maximum(scheduled, cycle_time / len(fleet))))
+    visits = np.zeros((tables.n_zones, tables.n_stations))  # bus visits per station per hour, any route
+    for route, fleet, headway in routes:
+        np.add.at(visits, (slice(None), route['stations']), (60 / headway)[:, None])
+    gap = 60 / np.maximum(visits, 1e-9)  # minutes between two buses at a station
+
+    hourly_board = np.zeros((tables.n_zones, tables.n_stations))
+    hourly_renege = np.zeros((tables.n_zones, tables.n_stations))
+    hourly_wait = np.zeros((tables.n_zones, tables.n_stations))  # total waiting time
+    bus_cost = 0
+    for route, fleet, headway in routes:
+        capacity = np.mean([info['capacity'] for info in fleet])
+        route_visits = 60 / headway  # visits of this route per station per hour
+        carry = np.zeros(len(route['stations']))  # passengers left behind by a full bus
+        for j in range(tables.n_zones):
+            load = 0
+            for k, i in enumerate(route['stations']):
+                h = gap[j, i]
+                fresh = arrival_rate[j, i] * min(h, WAITING_LIMIT)  # arrived within WAITING_LIMIT of the bus
+                expired = arrival_rate[j, i] * max(h - WAITING_LIMIT, 0)
+                fresh_wait = min(h, WAITING_LIMIT) / 2
+                load -= min(depart_rate[j, i] * h, load)
+                waiting = fresh + carry[k]
+                board = min(waiting, capacity - load)
+                left = waiting - board
+                load += board
+                if k == len(route['stations']) - 1:  # everyone gets off at terminal
+                    load = 0
+                carried_wait = min(fresh_wait + h, WAITING_LIMIT)
+                board_wait = (fresh * fresh_wait + carry[k] * carried_wait) / waiting if waiting else 0
+                hourly_board[j, i] += board * route_visits[j]
+                hourly_renege[j, i] += (expired + left / 2) * route_visits[j]
+                hourly_wait[j, i] += (board * board_wait + left / 2 * board_wait
+                                      + expired * WAITING_LIMIT) * route_visits[j]
+                carry[k] = left / 2
+
+        driving_distance = (route_visits * route['distance'].sum()).sum() / len(fleet)  # trips shared evenly
+        bus_cost += cost_model.bus_cost(np.full(len(fleet), driving_distance), [info['category'] for info in fleet],
+                                        [info['fuel'] for info in fleet]).sum()
+
+    passengers = hourly_board.sum()
+    total_waiting_time = hourly_wait.sum()
+    daily = cost_model.price(passengers, total_waiting_time, bus_cost)
+
+    return {
+        'case': case,
+        'passengers': passengers,
+        'profit': float(daily['profit']),
+        'waiting_time': float(daily['waiting_time']),
+        'renege': hourly_renege.sum(),
+        'waiting_cost_waste': float(daily['waiting_cost_waste']),
+        'net_profit': float(daily['net_profit']),
+        'hourly_board': hourly_board,
+        'hourly_renege': hourly_renege,
+        'hourly_wait': hourly_wait,
+    }
+
+
+def screen_cases(inputs, cases, options, top_k, key='profit'):
+    """Rank timetable cases by fluid estimate and keep the best ones for full DES.
+
+    :param inputs: dict returned by sweep.load_inputs.
+    :param cases: Iterable of case indices (0-based).
+    :param options: dict of simulation options. (see sweep.DEFAULT_OPTIONS)
+    :param top_k: Number of cases to keep.
+    :param key: Estimated statistic to rank by, higher is better.
+    :return: list of top_k case indices, best first.
+    """
+    estimates = [estimate_case(inputs, case, options) for case in cases]
+    estimates.sort(key=lambda estimate: estimate[key], reverse=True)
+    return [estimate['case'] for estimate in estimates[:top_k]]
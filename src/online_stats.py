@@ -0,0 +1,184 @@
+import math
+
+import numpy as np
+
+SUMMARY_KEYS = ['count', 'mean', 'std', 'min', 'max', 'p50', 'p90', 'p99']  # keys of WaitingTimeStats.summary
+QUANTILES = {'p50': 0.5, 'p90': 0.9, 'p99': 0.99}
+
+
+class WaitingTimeStats:
+    """Streaming statistics of passenger waiting times.
+
+    Every statistic is updated in O(1) per passenger and read in O(1) (quantiles in O(n_bins)),
+    so no list of waiting times grows during simulation.
+    Quantiles come from a fixed-width histogram and are accurate to bin_width minutes.
+
+    Attributes
+    ----------
+    count : int
+        Number of recorded waiting times.
+    total : float
+        Sum of recorded waiting times.
+    minimum : float
+        Smallest recorded waiting time. math.inf if nothing is recorded.
+    maximum : float
+        Largest recorded waiting time. -math.inf if nothing is recorded.
+    bin_width : float
+        Width of a histogram bin in minutes.
+    histogram : list[int]
+        Number of waiting times per bin. The last bin counts every waiting time beyond the range.
+
+    """
+    def __init__(self, bin_width=0.1, max_waiting_time=60):
+        """
+        :param bin_width: Width of a histogram bin in minutes.
+        :param max_waiting_time: Waiting times longer than this fall in the overflow bin.
+        """
+        self.count = 0
+        self.total = 0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.bin_width = bin_width
+        self.histogram = [0] * (int(max_waiting_time / bin_width) + 1)
+        self._mean = 0
+        self._m2 = 0  # sum of squared deviations from the mean (Welford's algorithm)
+
+    def reset(self):
+        """Forget every recorded waiting time, keeping the histogram bins."""
+        self.count = 0
+        self.total = 0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.histogram = [0] * len(self.histogram)
+        self._mean = 0
+        self._m2 = 0
+
+    def add(self, waiting_time, n=1):
+        """Record waiting time of n passengers who waited equally long.
+
+        :param waiting_time: Waiting time in minutes.
+        :param n: Number of passengers.
+        """
+        count = self.count + n
+        delta = waiting_time - self._mean
+        self._mean += delta * n / count
+        self._m2 += delta * (waiting_time - self._mean) * n
+        self.count = count
+        self.total += waiting_time * n
+        if waiting_time < self.minimum:
+            self.minimum = waiting_time
+        if waiting_time > self.maximum:
+            self.maximum = waiting_time
+        self.histogram[min(int(waiting_time / self.bin_width), len(self.histogram) - 1)] += n
+
+    def add_all(self, waiting_times):
+        """Record waiting time of each passenger of waiting_times, one by one as add does.
+
+        :param waiting_times: Iterable of waiting times in minutes.
+        """
+        count, total, mean, m2 = self.count, self.total, self._mean, self._m2
+        minimum, maximum = self.minimum, self.maximum
+        histogram, bin_width, last = self.histogram, self.bin_width, len(self.histogram) - 1
+        for waiting_time in waiting_times:
+            count += 1
+            delta = waiting_time - mean
+            mean += delta / count
+            m2 += delta * (waiting_time - mean)
+            total += waiting_time
+            if waiting_time < minimum:
+                minimum = waiting_time
+            if waiting_time > maximum:
+                maximum = waiting_time
+            histogram[min(int(waiting_time / bin_width), last)] += 1
+        self.count, self.total, self._mean, self._m2 = count, total, mean, m2
+        self.minimum, self.maximum = minimum, maximum
+
+    def merge(self, other):
+        """Add every waiting time recorded by other to this object.
+
+        :param other: WaitingTimeStats with the same histogram bins.
+        """
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other._mean - self._mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self._mean += delta * other.count / count
+        self.count = count
+        self.total += other.total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        for i, n in enumerate(other.histogram):
+            self.histogram[i] += n
+
+    @property
+    def mean(self):
+        """Average waiting time. 0 if nothing is recorded."""
+        return self.total / self.count if self.count else 0
+
+    @property
+    def variance(self):
+        """Sample variance of waiting times. 0 if less than two are recorded."""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0
+
+    def quantile(self, q):
+        """Estimate the q-quantile of waiting times by interpolating inside a histogram bin.
+
+        :param q: Quantile between 0 and 1. (ex: 0.9 for p90)
+        :return: float, 0 if nothing is recorded.
+        """
+        if self.count == 0:
+            return 0
+        rank = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.histogram):
+            if n and cumulative + n >= rank:
+                value = (i + (rank - cumulative) / n) * self.bin_width
+                return min(max(value, self.minimum), self.maximum)
+            cumulative += n
+        return self.maximum
+
+    def summary(self):
+        """Summarize statistics.
+
+        :return: dict keyed by SUMMARY_KEYS.
+        """
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'std': math.sqrt(self.variance),
+            'min': self.minimum if self.count else 0,
+            'max': self.maximum if self.count else 0,
+            **{key: self.quantile(q) for key, q in QUANTILES.items()},
+        }
+
+
+def summarize(stats):
+    """Summarize many WaitingTimeStats with the same histogram bins at once.
+
+    Quantiles of every object are found with a few array operations on their stacked histograms,
+    which gives the same values as WaitingTimeStats.quantile without a Python loop over bins.
+
+    :param stats: List of WaitingTimeStats. (ex: one per station)
+    :return: numpy.ndarray of shape [len(stats), len(SUMMARY_KEYS)], each row the values of summary().
+    """
+    table = np.zeros((len(stats), len(SUMMARY_KEYS)))
+    if not stats:
+        return table
+    count = np.array([s.count for s in stats], dtype=float)
+    table[:, 0] = count
+    table[:, 1] = [s.mean for s in stats]
+    table[:, 2] = [math.sqrt(s.variance) for s in stats]
+    table[:, 3] = [s.minimum if s.count else 0 for s in stats]
+    table[:, 4] = [s.maximum if s.count else 0 for s in stats]
+    histograms = np.array([s.histogram for s in stats], dtype=float)
+    cumulative = histograms.cumsum(axis=1)
+    rows = np.arange(len(stats))
+    for column, q in enumerate(QUANTILES.values(), start=5):
+        rank = q * count
+        i = (cumulative >= rank[:, None]).argmax(axis=1)  # first bin which reaches rank
+        n = histograms[rows, i]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            value = (i + (rank - (cumulative[rows, i] - n)) / n) * stats[0].bin_width
+        table[:, column] = np.where(count > 0, np.minimum(np.maximum(value, table[:, 3]), table[:, 4]), 0)
+    return table
@@ -0,0 +1,238 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from sweep import DEFAULT_OPTIONS, load_inputs, run_tasks
+
+# Global Variables -------------------
+n_days = 3  # days simulated per candidate timetable
+time_budget = 600  # wall-clock budget of the search (seconds)
+population = 16  # candidate timetables per iteration
+optimize_fleet = False  # also search the number of buses drawn from bus_info.csv
+stop_when_converged = True  # stop before time_budget once an iteration samples only evaluated timetables
+seed = 0
+n_workers = None  # None uses every core, 1 runs serially
+# ------------------------------------
+
+
+class TimetableOptimizer:
+    """Cross-entropy search over hourly bus dispatch headways, and optionally fleet size.
+
+    A candidate is a tuple of one mean headway per time zone and a number of buses
+    (the first n rows of bus_info.csv). Every time zone keeps a categorical distribution over
+    headway_choices. Each iteration samples a population of candidates, simulates each of them for
+    n_days in parallel, and moves the distributions toward the elite candidates.
+    The timetable cases of bus_idt.csv form the first population, so the search starts from
+    the best known case. Simulated candidates are cached and never simulated twice.
+
+    Attributes
+    ----------
+    inputs : dict
+        Input tables returned by sweep.load_inputs.
+    options : dict
+        Simulation options passed to sweep.run_tasks, with the timetable and fleet of each candidate.
+    n_days : int
+        Days simulated per candidate. Days share random numbers across candidates.
+    headway_choices : numpy.ndarray
+        Headways a time zone can take (min).
+    fleet_choices : list[int]
+        Numbers of buses a candidate can take.
+    key : str
+        Daily statistic to maximize. (key of sweep.run_tasks results)
+    probabilities : numpy.ndarray
+        Probability of each headway choice per time zone, of shape [zone, choice].
+    fleet_probabilities : numpy.ndarray
+        Probability of each fleet choice.
+    cache : dict[tuple, float]
+        Mean of key per evaluated candidate.
+    history : list[tuple]
+        (elapsed seconds, number of evaluated candidates, best value) after each iteration.
+
+    """
+    def __init__(self, inputs, options, n_days=3, headway_choices=None, optimize_fleet=False,
+                 elite_fraction=0.25, smoothing=0.7, n_workers=None, key='profit'):
+        """
+        :param inputs: dict returned by sweep.load_inputs.
+        :param options: dict of simulation options. Missing keys take values of sweep.DEFAULT_OPTIONS.
+        :param n_days: Days simulated per candidate.
+        :param headway_choices: Headways a time zone can take. Default is every headway in bus_idt.csv.
+        :param optimize_fleet: If True, also search the number of buses.
+        :param elite_fraction: Fraction of a population which updates the distributions.
+        :param smoothing: Weight of the elite frequencies in each update.
+        :param n_workers: Number of worker processes. None uses every core, 1 runs in this process.
+        :param key: Daily statistic to maximize.
+        """
+        self.inputs = inputs
+        self.options = {**DEFAULT_OPTIONS, **options}
+        self.n_days = n_days
+        tables = inputs['tables']
+        if headway_choices is None:
+            headway_choices = np.unique(tables.bus_idt[:, :, 0])
+        self.headway_choices = np.asarray(headway_choices, dtype=float)
+        n_buses = len(tables.bus_info)
+        self.fleet_choices = list(range(1, n_buses + 1)) if optimize_fleet else [n_buses]
+        self.elite_fraction = elite_fraction
+        self.smoothing = smoothing
+        self.n_workers = n_workers
+        self.key = key
+        self.rng = np.random.default_rng(self.options['seed'])
+        self.cache = {}
+        self.history = []
+
+        # start from how often each headway appears in the known cases, plus a uniform share
+        counts = (tables.bus_idt[:, :, 0, None] == self.headway_choices).sum(axis=0) + 1
+        self.probabilities = counts / counts.sum(axis=1, keepdims=True)
+        self.fleet_probabilities = np.full(len(self.fleet_choices), 1 / len(self.fleet_choices))
+
+    def known_cases(self):
+        """Candidates of the timetable cases in bus_idt.csv with the whole fleet."""
+        tables = self.inputs['tables']
+        return [(tuple(tables.bus_idt[case, :, 0]), len(tables.bus_info)) for case in range(tables.n_cases)]
+
+    def sample(self, n):
+        """Sample n candidates from the current distributions.
+
+        :param n: Number of candidates.
+        :return: list of (headways, n_buses) tuples.
+        """
+        candidates = []
+        for _ in range(n):
+            headways = tuple(self.headway_choices[self.rng.choice(len(self.headway_choices), p=p)]
+                             for p in self.probabilities)
+            n_buses = self.fleet_choices[self.rng.choice(len(self.fleet_choices), p=self.fleet_probabilities)]
+            candidates.append((headways, n_buses))
+        return candidates
+
+    def candidate_options(self, candidate):
+        """Simulation options which replace the timetable and fleet by those of candidate."""
+        headways, n_buses = candidate
+        timetable = np.column_stack([headways, np.zeros(len(headways))])
+        return {**self.options, 'timetable': timetable, 'fleet': self.inputs['tables'].bus_info[:n_buses]}
+
+    def uncached(self, candidates):
+        """Candidates which are not evaluated yet, without duplicates."""
+        return list(dict.fromkeys(candidate for candidate in candidates if candidate not in self.cache))
+
+    def evaluate(self, candidates):
+        """Simulate candidates which are not cached yet, all of them in one parallel sweep.
+
+        Every candidate is simulated as case 0, so its replication seeds do not depend on its
+        position in the sweep and all candidates share random numbers even without
+        common_random_numbers. Results come back in order of tasks to tell candidates apart.
+
+        :param candidates: List of candidates.
+        :return: list of mean key per candidate.
+        """
+        new = self.uncached(candidates)
+        tasks = [(0, day, self.candidate_options(candidate)) for candidate in new for day in range(self.n_days)]
+        totals = np.zeros(len(new))
+        for i, daily_result in enumerate(run_tasks(self.inputs, tasks, self.n_workers, ordered=True)):
+            totals[i // self.n_days] += daily_result[self.key]
+        for candidate, total in zip(new, totals):
+            self.cache[candidate] = total / self.n_days
+        return [self.cache[candidate] for candidate in candidates]
+
+    def update(self, candidates, values):
+        """Move the distributions toward the elite candidates.
+
+        :param candidates: List of candidates of one iteration.
+        :param values: Mean key of each candidate.
+        """
+        n_elite = max(1, int(len(candidates) * self.elite_fraction))
+        elite = [candidates[i] for i in np.argsort(values)[::-1][:n_elite]]
+        elite_headways = np.array([headways for headways, n_buses in elite])
+        frequency = (elite_headways[:, :, None] == self.headway_choices).mean(axis=0)
+        self.probabilities = self.smoothing * frequency + (1 - self.smoothing) * self.probabilities
+        fleet_frequency = np.array([[n_buses == choice for choice in self.fleet_choices]
+                                    for headways, n_buses in elite]).mean(axis=0)
+        self.fleet_probabilities = self.smoothing * fleet_frequency + (1 - self.smoothing) * self.fleet_probabilities
+
+    def best(self):
+        """Best evaluated candidate and its mean key."""
+        candidate = max(self.cache, key=self.cache.get)
+        return candidate, self.cache[candidate]
+
+    def run(self, time_budget, population=16, max_iterations=100, stop_when_converged=True):
+        """Search until time_budget seconds pass, max_iterations are done or the search converges.
+
+        Candidates are simulated in batches of at most population new candidates, as many as are
+        expected to finish within the budget at the time per candidate of the previous batch.
+        The very first batch is a single candidate which measures that time, and the known cases
+        of the first iteration are batched the same way, so the budget also holds when bus_idt.csv
+        has many cases. An iteration cut short by the budget still updates the distributions with
+        the candidates it evaluated.
+        The search has converged once an iteration samples no candidate that is not cached.
+
+        :param time_budget: Wall-clock budget in seconds.
+        :param population: Candidates sampled per iteration.
+        :param max_iterations: Maximum number of iterations after the known cases.
+        :param stop_when_converged: If True, stop once the search converges. If False, keep sampling
+            until the budget or max_iterations runs out.
+        :return: (best candidate, its mean key)
+        """
+        start = time.time()
+        seconds_per_candidate = 0
+        candidates = self.known_cases()
+        for iteration in range(max_iterations + 1):
+            new = self.uncached(candidates)
+            if iteration and not new and stop_when_converged:  # distributions converged to cached candidates
+                break
+            out_of_budget = False
+            while new:
+                remaining = time_budget - (time.time() - start)
+                if seconds_per_candidate == 0:  # time one candidate first
+                    n_fit = 1 if remaining > 0 else 0
+                else:
+                    n_fit = min(population, int(remaining / seconds_per_candidate))
+                if n_fit == 0:
+                    out_of_budget = True
+                    break
+                batch = new[:n_fit]
+                batch_start = time.time()
+                self.evaluate(batch)
+                seconds_per_candidate = (time.time() - batch_start) / len(batch)
+                new = new[len(batch):]
+            evaluated = [candidate for candidate in candidates if candidate in self.cache]
+            if not evaluated:
+                break
+            self.update(evaluated, [self.cache[candidate] for candidate in evaluated])
+            self.history.append((time.time() - start, len(self.cache), self.best()[1]))
+            if out_of_budget:
+                break
+            candidates = self.sample(population)
+        if not self.cache:
+            raise ValueError(f'no candidate could be evaluated in {time_budget} seconds')
+        return self.best()
+
+    def save(self, path, fleet_path=None):
+        """Write the best timetable to csv in the format of bus_idt.csv, and its fleet in the format of bus_info.csv.
+
+        :param path: Path of timetable csv file. (ex: 'output/optimized_bus_idt.csv')
+        :param fleet_path: Path of fleet csv file with the first n_buses rows of bus_info.csv,
+            or None to skip it. (ex: 'output/optimized_bus_info.csv')
+        """
+        headways, n_buses = self.best()[0]
+        zone_names = self.inputs['tables'].zone_names
+        timetable_df = pd.DataFrame({'time': zone_names, 'mean': headways, 'std': np.zeros(len(headways))})
+        timetable_df.to_csv(path, sep=',', index=False)
+        if fleet_path is not None:
+            fleet_df = pd.DataFrame(self.inputs['tables'].bus_info[:n_buses])
+            fleet_df.to_csv(fleet_path, sep=',', index=False)
+
+
+if __name__ == '__main__':
+    optimizer = TimetableOptimizer(load_inputs(), {'seed': seed}, n_days, optimize_fleet=optimize_fleet,
+                                   n_workers=n_workers)
+    (best_headways, best_n_buses), best_value = optimizer.run(time_budget, population,
+                                                              stop_when_converged=stop_when_converged)
+    baseline_value = max(optimizer.cache[candidate] for candidate in optimizer.known_cases()
+                         if candidate in optimizer.cache)
+
+    print(f'best known case profit: {baseline_value} won')
+    print(f'optimized profit: {best_value} won ({len(optimizer.cache)} timetables evaluated)')
+    print(f'optimized headways: {list(best_headways)}')
+    print(f'optimized number of buses: {best_n_buses}')
+    os.makedirs('output', exist_ok=True)
+    optimizer.save('output/optimized_bus_idt.csv', 'output/optimized_bus_info.csv' if optimize_fleet else None)
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+PSN_STD = 0.01  # standard deviation of passenger IAT and IDT (see passenger_data_readme.txt)
+BUS_IAT_STD = 0.1  # standard deviation of bus IAT
+
+
+class ParamTables:
+    """Hourly distribution parameters of a sweep compiled into contiguous numpy arrays.
+
+    Every table is read from csv once per sweep, so no pandas lookup happens during simulation.
+    Distribution parameters are numpy.array([mean, std]) pairs stored in the last axis.
+
+    Attributes
+    ----------
+    n_zones : int
+        Number of hourly time zones. (18 for 06:00 ~ 24:00)
+    n_stations : int
+        Number of stations. (rows of psn_iat.csv)
+    n_cases : int
+        Number of timetable cases.
+    zone_names : list[str]
+        Column names of time zones. (ex: '600', '700')
+    psn_iat : numpy.ndarray
+        Passenger inter-arrival time distribution of shape [zone, station, 2].
+    psn_idt : numpy.ndarray
+        Passenger inter-departure time distribution of shape [zone, station, 2].
+    bus_idt : numpy.ndarray
+        Bus inter-dispatch time distribution of shape [case, zone, 2].
+    routes : list[dict]
+        One dict per route with keys name, stations (station indices in driving order),
+        bus_iat (bus inter-arrival time distribution of shape [zone, position, 2])
+        and distance (distance from previous station of shape [position]).
+    bus_info : list[dict]
+        One dict of name, category, fuel, model, capacity and route name per bus.
+
+    """
+    def __init__(self, psn_iat_df, psn_idt_df, bus_iat_df, total_bus_idt_df, bus_info_df, routes_df=None):
+        """
+        :param psn_iat_df: pandas.DataFrame of psn_iat.csv
+        :param psn_idt_df: pandas.DataFrame of psn_idt.csv
+        :param bus_iat_df: pandas.DataFrame of bus_iat.csv, the route of every station in order.
+        :param total_bus_idt_df: pandas.DataFrame of bus_idt.csv with every case
+        :param bus_info_df: pandas.DataFrame of bus_info.csv
+        :param routes_df: pandas.DataFrame of routes.csv, which is bus_iat.csv with a route column in front.
+            If None, bus_iat.csv is the only route, named 'main'.
+        """
+        self.n_zones = len(total_bus_idt_df)
+        self.n_stations = len(psn_iat_df)
+        self.n_cases = int(len(total_bus_idt_df.columns) / 2)
+        self.zone_names = list(psn_idt_df.columns[1:self.n_zones + 1])
+        self.psn_iat, self.psn_idt = passenger_tables(psn_iat_df, psn_idt_df, self.n_zones)
+        bus_idt = total_bus_idt_df.iloc[:, 1:2 * self.n_cases + 1].to_numpy(dtype=float)
+        self.bus_idt = np.ascontiguousarray(bus_idt.reshape(self.n_zones, self.n_cases, 2).transpose(1, 0, 2))
+
+        if routes_df is None:
+            routes_df = pd.concat([pd.DataFrame({'route': 'main'}, index=bus_iat_df.index), bus_iat_df], axis=1)
+        self.routes = []
+        for name, route_df in routes_df.groupby('route', sort=False):
+            route_df = route_df.drop(columns='route')
+            self.routes.append({
+                'name': str(name),
+                'stations': route_df['station'].to_numpy(dtype=int),
+                'bus_iat': _zone_station_table(route_df, self.n_zones, BUS_IAT_STD),
+                'distance': route_df['distance'].to_numpy(dtype=float),
+            })
+            if not 0 <= self.routes[-1]['stations'].min() <= self.routes[-1]['stations'].max() < self.n_stations:
+                raise ValueError(f'route {name} stops at a station missing from psn_iat.csv')
+
+        route_names = [route['name'] for route in self.routes]
+        if len(route_names) > 1 and 'route' not in bus_info_df.columns:
+            raise ValueError('bus_info.csv needs a route column when there is more than one route')
+        self.bus_info = bus_info_df.to_dict('records')
+        for info in self.bus_info:
+            info['route'] = str(info.get('route', route_names[0]))
+            if info['route'] not in route_names:
+                raise ValueError(f"{info['name']} drives unknown route {info['route']}")
+
+
+def passenger_tables(psn_iat_df, psn_idt_df, n_zones):
+    """Compile passenger distribution tables, such as those of one day of the week.
+
+    Every mean must be positive. Station.count_departures draws inter-departure times until it
+    catches up with the clock, which never happens if the mean time is zero or negative.
+
+    :param psn_iat_df: pandas.DataFrame of psn_iat.csv
+    :param psn_idt_df: pandas.DataFrame of psn_idt.csv
+    :param n_zones: Number of time zones.
+    :return: (psn_iat, psn_idt), arrays of shape [zone, station, 2]. (see ParamTables)
+    """
+    if len(psn_iat_df) != len(psn_idt_df):
+        raise ValueError('psn_iat.csv and psn_idt.csv have different numbers of stations')
+    psn_iat = _zone_station_table(psn_iat_df, n_zones, PSN_STD)
+    psn_idt = _zone_station_table(psn_idt_df, n_zones, PSN_STD)
+    for name, table in (('psn_iat.csv', psn_iat), ('psn_idt.csv', psn_idt)):
+        if not (table[:, :, 0] > 0).all():
+            raise ValueError(f'{name} has a mean time which is not positive')
+    return psn_iat, psn_idt
+
+
+def _zone_station_table(df, n_zones, std):
+    """Convert a station x time zone csv table into a [zone, station, 2] array of (mean, std).
+
+    :param df: pandas.DataFrame with stations in rows and time zones in columns 1 ~ n_zones.
+    :param n_zones: Number of time zones.
+    :param std: Standard deviation shared by every entry.
+    """
+    table = np.empty((n_zones, len(df), 2))
+    table[:, :, 0] = df.iloc[:, 1:n_zones + 1].to_numpy(dtype=float).T
+    table[:, :, 1] = std
+    return table
@@ -0,0 +1,145 @@
+import time
+
+import pandas as pd
+import simpy
+
+
+class SimulationProfile:
+    """Events and wall time spent per process type of a simulation, and queue high-water marks.
+
+    Process types are named by the qualified name of their generator function.
+    (ex: 'Station.passenger_arrive', 'Bus.drive', 'monitor')
+    Bus.arrive is a function called inside Bus.drive, so time of Bus.drive includes Bus.arrive.
+
+    Attributes
+    ----------
+    events : dict[str, int]
+        Number of events each process type resumed on, or calls of Bus.arrive.
+    seconds : dict[str, float]
+        Wall time spent inside each process type (s).
+    queue_high_water : dict[str, int]
+        Longest boarding queue seen per station name.
+
+    """
+    def __init__(self):
+        self.events = {}
+        self.seconds = {}
+        self.queue_high_water = {}
+
+    def add(self, name, seconds, n=1):
+        """Add n events which took seconds in total to a process type."""
+        self.events[name] = self.events.get(name, 0) + n
+        self.seconds[name] = self.seconds.get(name, 0) + seconds
+
+    def observe_queue(self, station):
+        """Update the high-water mark of a station with its current boarding queue length."""
+        queue = station.boarding_queue
+        length = len(queue) if station.compact else len(queue.items)
+        if length >= self.queue_high_water.get(station.name, 0):
+            self.queue_high_water[station.name] = length
+
+    def merge(self, other):
+        """Add events and time of another profile, and keep the higher high-water marks."""
+        for name in other.events:
+            self.add(name, other.seconds[name], other.events[name])
+        for station_name, length in other.queue_high_water.items():
+            if length >= self.queue_high_water.get(station_name, 0):
+                self.queue_high_water[station_name] = length
+
+    def instrument_buses(self, buses):
+        """Time every Bus.arrive call and observe the queue of the station before boarding.
+
+        A boarding queue only grows between bus arrivals, so its high-water mark is reached
+        right before a bus arrives or at the end of the day.
+
+        Buses have __slots__, so instead of replacing arrive of each bus, buses are switched to
+        a subclass whose arrive is timed. The subclass adds no slot, so its buses keep their layout.
+
+        :param buses: List of bus_system.Bus.
+        """
+        timed_classes = {}
+        for bus in buses:
+            cls = type(bus)
+            if cls not in timed_classes:
+                timed_classes[cls] = self._timed_class(cls)
+            bus.__class__ = timed_classes[cls]
+
+    def _timed_class(self, cls):
+        """Subclass of a bus class whose arrive is timed into this profile."""
+        profile = self
+        arrive = cls.arrive
+
+        def timed_arrive(bus, station):
+            profile.observe_queue(station)
+            start = time.perf_counter()
+            n_moved = arrive(bus, station)
+            profile.add('Bus.arrive', time.perf_counter() - start)
+            return n_moved
+        return type('Timed' + cls.__name__, (cls,), {'__slots__': (), 'arrive': timed_arrive})
+
+    def summary(self):
+        """Table of events, total time, time per event and share of time per process type.
+
+        :return: pandas.DataFrame indexed by process type, sorted by time.
+        """
+        summary_df = pd.DataFrame({'events': pd.Series(self.events), 'seconds': pd.Series(self.seconds)})
+        summary_df['us_per_event'] = summary_df['seconds'] / summary_df['events'] * 1e6
+        # Bus.arrive runs inside Bus.drive, so it is left out of the total
+        total = summary_df['seconds'].drop('Bus.arrive', errors='ignore').sum()
+        summary_df['share'] = summary_df['seconds'] / total
+        return summary_df.sort_values('seconds', ascending=False)
+
+
+class CountingEnvironment(simpy.Environment):
+    """simpy.Environment which counts processed events.
+
+    Attributes
+    ----------
+    n_events : int
+        Number of events processed so far.
+
+    """
+    def __init__(self, initial_time=0):
+        super().__init__(initial_time)
+        self.n_events = 0
+
+    def step(self):
+        self.n_events += 1
+        super().step()
+
+
+class ProfilingEnvironment(CountingEnvironment):
+    """simpy.Environment which times every process it runs into a SimulationProfile.
+
+    Only this environment wraps processes, so a simulation in a plain simpy.Environment
+    pays nothing for profiling.
+
+    Attributes
+    ----------
+    profile : SimulationProfile
+        Profile of processes run in this environment.
+
+    """
+    def __init__(self, initial_time=0, profile=None):
+        super().__init__(initial_time)
+        self.profile = SimulationProfile() if profile is None else profile
+
+    def process(self, generator):
+        return super().process(self._timed(generator.__qualname__, generator))
+
+    def _timed(self, name, generator):
+        """Drive generator like simpy does, timing each resumption."""
+        add = self.profile.add
+        value, error = None, None
+        while True:
+            start = time.perf_counter()
+            try:
+                event = generator.send(value) if error is None else generator.throw(error)
+            except StopIteration as stop:
+                add(name, time.perf_counter() - start)
+                return stop.value
+            add(name, time.perf_counter() - start)
+            try:
+                value, error = (yield event), None
+            except Exception as exception:  # failed event or interrupt, handled by generator
+                value, error = None, exception
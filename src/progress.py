@@ -0,0 +1,156 @@
+import json
+import socket
+import threading
+import time
+
+
+class ProgressFeed:
+    """Live progress of a sweep as JSON lines, for tail -f on a file or any client of a local socket.
+
+    Every update carries replications done, throughput, ETA and the current best case by mean of
+    rank_key. Resumed replications count as done but not in throughput, so the ETA reflects
+    how fast this run simulates. Lines are published at most every interval seconds, and always
+    for the last replication.
+
+    Attributes
+    ----------
+    total : int
+        Number of replications of the sweep. (upper bound with adaptive replication)
+    path : str or None
+        File the feed is written to, truncated when the feed starts.
+    port : int or None
+        Port of the socket server on 127.0.0.1. Every client receives the latest line
+        when it connects and every line after that.
+    rank_key : str
+        Daily statistic which ranks cases, higher is better.
+    done : int
+        Replications finished, including resumed ones.
+    resumed : int
+        Replications read from a checkpoint instead of simulated.
+
+    """
+    def __init__(self, total, path=None, port=None, interval=1.0, rank_key='profit'):
+        """
+        :param total: Number of replications of the sweep.
+        :param path: File to write the feed to, or None.
+        :param port: Port of a socket server on 127.0.0.1, or None. 0 picks a free port.
+        :param interval: Minimum seconds between published lines.
+        :param rank_key: Daily statistic which ranks cases, higher is better.
+        """
+        self.total = total
+        self.path = path
+        self.interval = interval
+        self.rank_key = rank_key
+        self.done = 0
+        self.resumed = 0
+        self._start = time.time()
+        self._last_publish = -float('inf')
+        self._last_line = None
+        self._last_result = None
+        self._published_done = 0
+        self._sums = {}  # case -> (days, sum of rank_key)
+        self._file = open(path, 'w') if path is not None else None
+        self._clients = []
+        self._lock = threading.Lock()
+        self._server = None
+        self.port = port
+        if port is not None:
+            self._server = socket.create_server(('127.0.0.1', port))
+            self.port = self._server.getsockname()[1]
+            threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        """Accept socket clients until the server closes."""
+        while True:
+            try:
+                client, address = self._server.accept()
+            except OSError:  # server closed
+                return
+            client.settimeout(1.0)  # a stalled client must not stall the sweep
+            with self._lock:
+                if self._last_line is not None:
+                    try:
+                        client.sendall(self._last_line)
+                    except OSError:
+                        client.close()
+                        continue
+                self._clients.append(client)
+
+    def best_case(self):
+        """(case, mean of rank_key, days) of the best case so far, or None."""
+        if not self._sums:
+            return None
+        case = max(self._sums, key=lambda c: self._sums[c][1] / self._sums[c][0])
+        days, total = self._sums[case]
+        return case, total / days, days
+
+    def update(self, daily_result, resumed=False):
+        """Count a finished replication and publish progress if interval has passed.
+
+        :param daily_result: dict returned by sweep.simulate_day.
+        :param resumed: True if the replication was read from a checkpoint.
+        """
+        self.done += 1
+        self.resumed += resumed
+        days, total = self._sums.get(daily_result['case'], (0, 0))
+        self._sums[daily_result['case']] = days + 1, total + daily_result[self.rank_key]
+        self._last_result = daily_result
+        now = time.time()
+        if now - self._last_publish >= self.interval or self.done >= self.total:
+            self.publish(now)
+
+    def publish(self, now=None):
+        """Write one line of progress to the file and every socket client.
+
+        :param now: Current time.time(), or None.
+        """
+        now = time.time() if now is None else now
+        daily_result = self._last_result
+        elapsed = now - self._start
+        simulated = self.done - self.resumed
+        per_second = simulated / elapsed if elapsed > 0 else 0
+        remaining = max(self.total - self.done, 0)
+        best = self.best_case()
+        record = {
+            'time': now,
+            'done': self.done,
+            'total': self.total,
+            'resumed': self.resumed,
+            'elapsed_seconds': elapsed,
+            'replications_per_second': per_second,
+            'eta_seconds': remaining / per_second if per_second > 0 else None,
+            'best_case': None if best is None else best[0] + 1,
+            'best_' + self.rank_key: None if best is None else best[1],
+            'best_days': None if best is None else best[2],
+            'last': None if daily_result is None else [daily_result['case'] + 1, daily_result['day']],
+        }
+        line = (json.dumps(record) + '\n').encode()
+        self._last_publish = now
+        self._published_done = self.done
+        if self._file is not None:
+            self._file.write(line.decode())
+            self._file.flush()
+        with self._lock:
+            self._last_line = line
+            for client in list(self._clients):
+                try:
+                    client.sendall(line)
+                except OSError:  # client went away
+                    client.close()
+                    self._clients.remove(client)
+
+    def close(self):
+        """Publish the final progress if it is not published yet, then close the file, the server and every client.
+
+        A sweep with adaptive replication may finish before total replications.
+        """
+        if self._published_done != self.done:
+            self.publish()
+        if self._file is not None:
+            self._file.close()
+        if self._server is not None:
+            self._server.close()
+        with self._lock:
+            for client in self._clients:
+                client.close()
+            self._clients.clear()
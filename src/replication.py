@@ -0,0 +1,215 @@
+import math
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from statistics import NormalDist, mean, stdev
+
+from sweep import (_init_worker, _operate_day_in_worker, _simulate_day_in_worker, operate_day, price_cached_day,
+                   price_day, simulate_day)
+
+
+def t_quantile(confidence, dof):
+    """Two-sided critical value of Student's t distribution.
+
+    Uses the Cornish-Fisher expansion around the normal quantile (Abramowitz and Stegun 26.7.5),
+    accurate to a few percent from 2 degrees of freedom on.
+
+    :param confidence: Confidence level. (ex: 0.95)
+    :param dof: Degrees of freedom.
+    """
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    return (z + (z ** 3 + z) / (4 * dof)
+            + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * dof ** 2)
+            + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * dof ** 3))
+
+
+class ReplicationController:
+    """Decide how many days to simulate per case from running confidence intervals.
+
+    A case stops once the confidence interval of every key in keys is narrower than
+    precision times its mean, or once max_days are simulated. A case is dropped early if the upper
+    bound of its rank_key interval falls below the mean of the current best case.
+
+    Attributes
+    ----------
+    cases : list[int]
+        Case indices (0-based) under control.
+    min_days : int
+        Days simulated per case before it may stop or be dropped.
+    max_days : int
+        Maximum days simulated per case.
+    precision : float
+        Target half width of confidence intervals relative to the mean. (ex: 0.01 for 1%)
+    confidence : float
+        Confidence level of intervals.
+    keys : tuple[str]
+        Daily statistics which need a tight interval. (keys of sweep.simulate_day results)
+    rank_key : str
+        Daily statistic which ranks cases, higher is better.
+    values : dict[int, dict[str, list[float]]]
+        Daily statistics observed so far per case and key.
+    dropped : set[int]
+        Cases dropped because they cannot be the best.
+
+    """
+    def __init__(self, cases, min_days=3, max_days=10, precision=0.01, confidence=0.95,
+                 keys=('profit', 'net_profit'), rank_key='profit'):
+        """
+        :param cases: Iterable of case indices (0-based).
+        :param min_days: Days simulated per case before it may stop or be dropped.
+        :param max_days: Maximum days simulated per case.
+        :param precision: Target half width of confidence intervals relative to the mean.
+        :param confidence: Confidence level of intervals.
+        :param keys: Daily statistics which need a tight interval.
+        :param rank_key: Daily statistic which ranks cases, higher is better.
+        """
+        self.cases = list(cases)
+        self.min_days = max(min_days, 2)
+        self.max_days = max_days
+        self.precision = precision
+        self.confidence = confidence
+        self.keys = tuple(keys)
+        self.rank_key = rank_key
+        self.values = {case: {key: [] for key in set(self.keys) | {rank_key}} for case in self.cases}
+        self.dropped = set()
+        self._scheduled = {case: 0 for case in self.cases}  # days handed out by next_replication
+
+    def n_days(self, case):
+        """Number of days observed for case."""
+        return len(self.values[case][self.rank_key])
+
+    def interval(self, case, key):
+        """Confidence interval of the mean of a daily statistic.
+
+        :param case: Case index.
+        :param key: Daily statistic.
+        :return: (mean, half width). Half width is math.inf with less than two days.
+        """
+        values = self.values[case][key]
+        if len(values) < 2:
+            return (values[0] if values else 0), math.inf
+        return mean(values), t_quantile(self.confidence, len(values) - 1) * stdev(values) / math.sqrt(len(values))
+
+    def is_done(self, case):
+        """True if case needs no more days."""
+        n = self.n_days(case)
+        if case in self.dropped or n >= self.max_days:
+            return True
+        if n < self.min_days:
+            return False
+        for key in self.keys:
+            average, half_width = self.interval(case, key)
+            if half_width > self.precision * abs(average):
+                return False
+        return True
+
+    def best_case(self):
+        """Case with the highest mean of rank_key among cases with at least min_days, or None."""
+        candidates = [case for case in self.cases
+                      if case not in self.dropped and self.n_days(case) >= self.min_days]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda case: self.interval(case, self.rank_key)[0])
+
+    def add(self, daily_result):
+        """Record a simulated day and drop cases which cannot be the best anymore.
+
+        :param daily_result: dict returned by sweep.simulate_day.
+        """
+        for key, values in self.values[daily_result['case']].items():
+            values.append(daily_result[key])
+
+        best = self.best_case()
+        if best is None:
+            return
+        best_mean = self.interval(best, self.rank_key)[0]
+        for case in self.cases:
+            if case == best or case in self.dropped or self.n_days(case) < self.min_days:
+                continue
+            average, half_width = self.interval(case, self.rank_key)
+            if average + half_width < best_mean:
+                self.dropped.add(case)
+
+    def next_replication(self):
+        """Hand out the next (case, day) to simulate, favoring the case with fewest days.
+
+        :return: (case, day), or None if no case needs a day now.
+        """
+        pending = [case for case in self.cases
+                   if not self.is_done(case) and self._scheduled[case] < self.max_days]
+        if not pending:
+            return None
+        case = min(pending, key=lambda c: self._scheduled[c])
+        day = self._scheduled[case]
+        self._scheduled[case] += 1
+        return case, day
+
+
+def run_adaptive_sweep(inputs, controller, options, n_workers=None, cache=None, resumed=None):
+    """Simulate days chosen by a ReplicationController until every case is done.
+
+    At most n_workers days are in flight, so stopping decisions use every finished day.
+    Days of a case are numbered in order, so the seed of each day matches sweep.run_sweep.
+
+    :param inputs: dict returned by sweep.load_inputs.
+    :param controller: ReplicationController of the cases.
+    :param options: dict of simulation options passed to sweep.simulate_day.
+    :param n_workers: Number of worker processes. None uses every core, 1 runs in this process.
+    :param cache: result_cache.ResultCache of simulated days, or None.
+    :param resumed: dict of simulate_day results keyed by (case, day), used instead of simulating
+        the days the controller asks for again. (ex: checkpoint.Checkpoint.load)
+    :return: generator of simulate_day results in order of completion.
+    """
+    resumed = resumed or {}
+
+    def cached(case, day):
+        """Resumed or cached priced day, or None. Also returns the key to store a simulated day under."""
+        if (case, day) in resumed:
+            return resumed[case, day], None
+        if cache is None:
+            return None, None
+        key = cache.key(case, day, options)
+        operation = cache.get(key)
+        if operation is None:
+            return None, key
+        return price_cached_day(inputs, operation, case, day, options), key
+
+    def finish(operation, key):
+        if cache is None:
+            return operation  # already priced by simulate_day
+        cache.put(key, operation)
+        return price_day(inputs, operation, options)
+
+    n_slots = n_workers or os.cpu_count()
+    if n_workers == 1:
+        while True:
+            replication = controller.next_replication()
+            if replication is None:
+                return
+            daily_result, key = cached(*replication)
+            if daily_result is None:
+                simulate = simulate_day if cache is None else operate_day
+                daily_result = finish(simulate(inputs, *replication, options), key)
+            controller.add(daily_result)
+            yield daily_result
+
+    task = _simulate_day_in_worker if cache is None else _operate_day_in_worker
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(inputs,)) as pool:
+        running = {}
+        while True:
+            while len(running) < n_slots:
+                replication = controller.next_replication()
+                if replication is None:
+                    break
+                daily_result, key = cached(*replication)
+                if daily_result is not None:
+                    controller.add(daily_result)
+                    yield daily_result
+                    continue
+                running[pool.submit(task, *replication, options)] = key
+            if not running:
+                return
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                daily_result = finish(future.result(), running.pop(future))
+                controller.add(daily_result)
+                yield daily_result
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+
+import bus_system
+import online_stats
+import param_tables
+import sampler
+import sweep
+import timestamp_queue
+from sweep import replication_seed, simulation_options
+
+# options which change what is simulated, as opposed to how it is priced
+SIMULATION_OPTIONS = ['common_random_numbers', 'buffered_sampling', 'compact_queues', 'dwell_time']
+# bump when cached records change meaning without an edit to SIMULATION_MODULES (ex: a new pickle layout)
+CACHE_VERSION = 1
+# modules whose source decides what a simulated day returns
+SIMULATION_MODULES = [bus_system, online_stats, param_tables, sampler, sweep, timestamp_queue]
+
+
+def code_digest():
+    """Hash of CACHE_VERSION and the source of SIMULATION_MODULES.
+
+    Any edit to the simulation code, even one which does not change results, gives a new digest,
+    so days simulated by other code are never read.
+
+    :return: bytes
+    """
+    digest = hashlib.sha256(str(CACHE_VERSION).encode())
+    for module in SIMULATION_MODULES:
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.digest()
+
+
+def input_digest(tables):
+    """Hash of the passenger distribution tables and routes a simulation depends on.
+
+    :param tables: param_tables.ParamTables
+    :return: bytes
+    """
+    digest = hashlib.sha256()
+    for array in (tables.psn_iat, tables.psn_idt):
+        digest.update(np.ascontiguousarray(array, dtype=float).tobytes())
+    for route in tables.routes:
+        digest.update(route['name'].encode())
+        for array in (route['stations'], route['bus_iat'], route['distance']):
+            digest.update(np.ascontiguousarray(array, dtype=float).tobytes())
+    return digest.digest()
+
+
+class ResultCache:
+    """Content-addressed on-disk cache of simulated days.
+
+    A day is stored as the result of sweep.operate_day under a key which hashes everything the
+    simulation depends on: the simulation code (see code_digest), passenger distribution tables
+    (of the scenario, if any), routes, the case's headways, the fleet, WAITING_LIMIT,
+    the replication seed and simulation options.
+    Costs are not part of the key, so a day cached under old fares or fuel costs is priced again
+    by sweep.price_day without simulating it again.
+    The least recently used days are deleted once the cache grows beyond max_bytes.
+
+    Attributes
+    ----------
+    cache_dir : str
+        Directory of cached days, one pickle file per day.
+    max_bytes : int
+        Maximum total size of cached files.
+    code_digest : bytes
+        Hash of the simulation code.
+    input_digest : bytes
+        Hash of the simulation input tables.
+
+    """
+    def __init__(self, inputs, cache_dir, max_bytes=256 * 2 ** 20):
+        """
+        :param inputs: dict returned by sweep.load_inputs.
+        :param cache_dir: Directory of cached days. Created if missing.
+        :param max_bytes: Maximum total size of cached files.
+        """
+        self.inputs = inputs
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.code_digest = code_digest()
+        self.input_digest = input_digest(inputs['tables'])
+        self._total_bytes = sum(size for mtime, size, path in self._entries())
+
+    def key(self, case, day, options):
+        """Cache key of a simulated day.
+
+        :param case: Case index (0-based).
+        :param day: Day index (0-based).
+        :param options: dict of simulation options.
+        :return: str hex digest.
+        """
+        options = simulation_options(options)
+        tables = self.inputs['tables']
+        bus_idt = tables.bus_idt[case] if options['timetable'] is None else options['timetable']
+        fleet = tables.bus_info if options['fleet'] is None else options['fleet']
+        settings = {
+            'fleet': fleet,
+            'waiting_limit': bus_system.WAITING_LIMIT,
+            'seed': replication_seed(options['seed'], case, day, options['common_random_numbers']),
+            **{name: options[name] for name in SIMULATION_OPTIONS},
+        }
+        digest = hashlib.sha256(self.code_digest + self.input_digest)
+        digest.update(np.ascontiguousarray(bus_idt, dtype=float).tobytes())
+        if options['scenario'] is not None:
+            for array in self.inputs['scenarios'][options['scenario']]:
+                digest.update(np.ascontiguousarray(array, dtype=float).tobytes())
+        digest.update(json.dumps(settings, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.pkl')
+
+    def get(self, key):
+        """Read a cached day and mark it as recently used.
+
+        :param key: Cache key.
+        :return: dict returned by sweep.operate_day, or None if not cached.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                operation = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        os.utime(path)
+        return operation
+
+    def put(self, key, operation):
+        """Store a simulated day, then evict least recently used days beyond max_bytes.
+
+        A day already stored under key is replaced, and its size no longer counts.
+
+        :param key: Cache key.
+        :param operation: dict returned by sweep.operate_day.
+        """
+        path = self._path(key)
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(operation, f, protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            replaced_bytes = os.path.getsize(path)
+        except OSError:  # not cached yet
+            replaced_bytes = 0
+        os.replace(path + '.tmp', path)
+        self._total_bytes += os.path.getsize(path) - replaced_bytes
+        if self._total_bytes > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        """(last used time, size, path) of every cached day."""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.pkl'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        """Delete least recently used days until the cache fits in max_bytes."""
+        entries = self._entries()
+        self._total_bytes = sum(size for mtime, size, path in entries)
+        for mtime, size, path in sorted(entries):
+            if self._total_bytes <= self.max_bytes:
+                break
+            os.remove(path)
+            self._total_bytes -= size
@@ -0,0 +1,145 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from online_stats import SUMMARY_KEYS
+from sweep import CSV_NAMES
+
+METRICS = [name.replace(' ', '_') for name in CSV_NAMES]  # board, depart, ..., bus_users, drive_time, ...
+STATION_METRICS = METRICS[:4]  # hourly metrics of stations, the rest are hourly metrics of buses
+DAILY_KEYS = ['profit', 'waiting_time', 'renege', 'waiting_cost_waste', 'net_profit', 'passengers',
+              'total_waiting_time']
+# daily waiting time statistics of every passenger, keyed by DAILY_KEYS name and online_stats summary name
+WAITING_KEYS = {'wait_std': 'std', 'wait_p50': 'p50', 'wait_p90': 'p90', 'wait_p99': 'p99'}
+DAILY_KEYS += list(WAITING_KEYS)
+
+
+class ResultStore:
+    """Results of every replication of a sweep in preallocated numpy arrays.
+
+    Hourly summaries are kept per metric in one array of shape [case, day, hour, station or bus],
+    and daily statistics in one array of shape [case, day] per key, so no day overwrites another.
+    Arrays live in memory, or in memory-mapped .npy files if mmap_dir is given.
+
+    Attributes
+    ----------
+    hourly : dict[str, numpy.ndarray]
+        Hourly summary arrays keyed by metric name. (see METRICS)
+    daily : dict[str, numpy.ndarray]
+        Daily statistic arrays keyed by DAILY_KEYS.
+    station_waiting : numpy.ndarray
+        Daily waiting time statistics of each station of shape [case, day, station, stat],
+        with stats in order of online_stats.SUMMARY_KEYS.
+    hourly_waiting : numpy.ndarray
+        Waiting time statistics of each hour and station of shape [case, day, hour, station, stat].
+    driving_distance : numpy.ndarray
+        Daily driving distance per bus of shape [case, day, bus], to price replications again.
+        (see economics.CostModel.price_store)
+    recorded : numpy.ndarray
+        Boolean array of shape [case, day]. True if the replication is recorded.
+
+    """
+    def __init__(self, n_cases, n_days, n_hours, n_stations, n_buses, mmap_dir=None):
+        """
+        :param n_cases: Number of timetable cases.
+        :param n_days: Number of days per case.
+        :param n_hours: Number of hourly summaries per day.
+        :param n_stations: Number of stations.
+        :param n_buses: Number of buses.
+        :param mmap_dir: Directory of memory-mapped .npy files. If None, arrays are kept in memory.
+        """
+        def allocate(name, shape, dtype=float):
+            if mmap_dir is None:
+                return np.zeros(shape, dtype=dtype)
+            return np.lib.format.open_memmap(os.path.join(mmap_dir, name + '.npy'), mode='w+',
+                                             dtype=dtype, shape=shape)
+
+        if mmap_dir is not None:
+            os.makedirs(mmap_dir, exist_ok=True)
+        self.hourly = {}
+        for metric in METRICS:
+            n_entities = n_stations if metric in STATION_METRICS else n_buses
+            self.hourly[metric] = allocate(metric, (n_cases, n_days, n_hours, n_entities))
+        self.daily = {key: allocate('daily_' + key, (n_cases, n_days)) for key in DAILY_KEYS}
+        n_stats = len(SUMMARY_KEYS)
+        self.station_waiting = allocate('station_waiting', (n_cases, n_days, n_stations, n_stats))
+        self.hourly_waiting = allocate('hourly_waiting', (n_cases, n_days, n_hours, n_stations, n_stats))
+        self.driving_distance = allocate('driving_distance', (n_cases, n_days, n_buses))
+        self.recorded = allocate('recorded', (n_cases, n_days), dtype=bool)
+
+    def record(self, daily_result):
+        """Copy one replication into the arrays.
+
+        :param daily_result: dict returned by sweep.simulate_day.
+        """
+        case, day = daily_result['case'], daily_result['day']
+        for metric, summary in zip(METRICS, daily_result['hour_summaries']):
+            self.hourly[metric][case, day] = summary
+        for key in DAILY_KEYS:
+            if key in WAITING_KEYS:
+                self.daily[key][case, day] = daily_result['waiting_summary'][WAITING_KEYS[key]]
+            else:
+                self.daily[key][case, day] = daily_result[key]
+        self.station_waiting[case, day] = daily_result['station_waiting_summary']
+        self.hourly_waiting[case, day] = daily_result['hour_waiting_summary']
+        distances = [bus['driving_distance'] for bus in daily_result['buses']]
+        self.driving_distance[case, day, :len(distances)] = distances
+        self.recorded[case, day] = True
+
+    def save(self, path):
+        """Write every array to one compressed .npz file.
+
+        :param path: Path of .npz file. (ex: 'output/results.npz')
+        """
+        np.savez_compressed(path, recorded=self.recorded, driving_distance=self.driving_distance,
+                            station_waiting=self.station_waiting, hourly_waiting=self.hourly_waiting, **self.hourly,
+                            **{'daily_' + key: array for key, array in self.daily.items()})
+
+    @classmethod
+    def load(cls, path):
+        """Read a ResultStore written by save.
+
+        :param path: Path of .npz file.
+        :return: ResultStore
+        """
+        store = cls.__new__(cls)
+        with np.load(path) as data:
+            store.hourly = {metric: data[metric] for metric in METRICS}
+            store.daily = {key: data['daily_' + key] for key in DAILY_KEYS}
+            store.driving_distance = data['driving_distance']
+            store.station_waiting = data['station_waiting']
+            store.hourly_waiting = data['hourly_waiting']
+            store.recorded = data['recorded']
+        return store
+
+    def export_csv(self, output_dir, zone_names, day=None):
+        """Write hourly summaries of one day to output_dir/case{n}/*.csv like run_simulation.py did.
+
+        Waiting time statistics of each station go to 'waiting stats.csv', and those of each station
+        and hour to 'hourly waiting stats.csv'. Cases whose day is not recorded are skipped.
+
+        :param output_dir: Output directory. (ex: 'output')
+        :param zone_names: Column names of hours. (ex: ParamTables.zone_names)
+        :param day: Day index to export. Default is the last recorded day of each case.
+        """
+        for case in range(self.recorded.shape[0]):
+            recorded_days = np.flatnonzero(self.recorded[case])
+            if day is not None and not self.recorded[case, day]:
+                continue
+            if day is None and len(recorded_days) == 0:
+                continue
+            case_day = recorded_days[-1] if day is None else day
+            case_dir = os.path.join(output_dir, 'case' + str(case + 1))
+            os.makedirs(case_dir, exist_ok=True)
+            for metric, filename in zip(METRICS, CSV_NAMES):
+                summary_df = pd.DataFrame(np.transpose(self.hourly[metric][case, case_day]), columns=zone_names)
+                summary_df.to_csv(os.path.join(case_dir, filename + '.csv'), sep=',')
+            waiting_df = pd.DataFrame(self.station_waiting[case, case_day], columns=SUMMARY_KEYS)
+            waiting_df.index.name = 'station'
+            waiting_df.to_csv(os.path.join(case_dir, 'waiting stats.csv'), sep=',')
+            hourly_waiting = np.transpose(self.hourly_waiting[case, case_day], (1, 0, 2))  # [station, hour, stat]
+            index = pd.MultiIndex.from_product([range(hourly_waiting.shape[0]), zone_names], names=['station', 'time'])
+            hourly_waiting_df = pd.DataFrame(hourly_waiting.reshape(-1, len(SUMMARY_KEYS)), index=index,
+                                             columns=SUMMARY_KEYS)
+            hourly_waiting_df.to_csv(os.path.join(case_dir, 'hourly waiting stats.csv'), sep=',')
@@ -0,0 +1,193 @@
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from replication import t_quantile
+from result_store import DAILY_KEYS, METRICS
+
+
+class RunResults:
+    """Lazy read-only access to the results of a run, while the run is still writing them or after.
+
+    A run is read from the memory-mapped .npy files of run_simulation.results_mmap_dir, which a running
+    sweep fills one replication at a time, or from a finished output/results.npz.
+    Arrays are opened only when first asked for, and slices of memory-mapped arrays read only the
+    requested part from disk. Replications count once their recorded flag is set, which
+    result_store.ResultStore.record sets after every other array of the replication.
+
+    Statistics of daily keys are updated incrementally: refresh reads only the replications recorded
+    since the previous refresh, so ranking a run of hundreds of cases while it grows stays cheap.
+
+    Attributes
+    ----------
+    path : str
+        Directory of .npy files or path of .npz file.
+    mmap : bool
+        True if results are read from memory-mapped .npy files.
+    n_cases : int
+        Number of timetable cases of the run.
+    n_days : int
+        Maximum number of days per case of the run.
+    seen : numpy.ndarray
+        Boolean array of shape [case, day]. True if the replication is counted in statistics.
+
+    """
+    def __init__(self, path):
+        """
+        :param path: results_mmap_dir of a run, results.npz of a run, or a directory containing results.npz.
+            (ex: 'output/results', 'output')
+        """
+        if os.path.isdir(path) and not os.path.exists(os.path.join(path, 'recorded.npy')):
+            path = os.path.join(path, 'results.npz')
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'no results of a run in {path}')
+        self.path = path
+        self.mmap = os.path.isdir(path)
+        self._npz = None if self.mmap else np.load(path)
+        self._arrays = {}
+        self.n_cases, self.n_days = self._array('recorded').shape
+        self.seen = np.zeros((self.n_cases, self.n_days), dtype=bool)
+        # running count, sum and sum of squares of every daily key per case
+        self._count = np.zeros(self.n_cases, dtype=int)
+        self._sums = {key: np.zeros(self.n_cases) for key in DAILY_KEYS}
+        self._squares = {key: np.zeros(self.n_cases) for key in DAILY_KEYS}
+
+    def _array(self, name):
+        """Array of a run by file name, opened once. (ex: 'board', 'daily_profit', 'recorded')"""
+        if name not in self._arrays:
+            if self.mmap:
+                self._arrays[name] = np.load(os.path.join(self.path, name + '.npy'), mmap_mode='r')
+            else:
+                self._arrays[name] = self._npz[name]
+        return self._arrays[name]
+
+    @property
+    def recorded(self):
+        """Boolean array of shape [case, day] of replications recorded so far, read again on every access."""
+        return np.array(self._array('recorded'))
+
+    def hourly(self, metric, case=slice(None), day=slice(None), hour=slice(None)):
+        """Slice of an hourly metric, read without loading the rest of it.
+
+        Unrecorded days are zeros.
+
+        :param metric: Metric name. (see result_store.METRICS, ex: 'board', 'drive_time')
+        :param case: Case index (0-based), list of indices or slice. Default is every case.
+        :param day: Day index, list of indices or slice. Default is every day.
+        :param hour: Hour index, list of indices or slice. Default is every hour.
+        :return: numpy.ndarray indexed by [case, day, hour, station or bus], without axes given an index.
+        """
+        if metric not in METRICS:
+            raise KeyError(f'unknown metric {metric}, expected one of {METRICS}')
+        return np.array(self._array(metric)[case, day, hour])
+
+    def daily(self, key, case=slice(None)):
+        """Daily statistic of recorded replications.
+
+        :param key: Daily key. (see result_store.DAILY_KEYS, ex: 'profit')
+        :param case: Case index (0-based), list of indices or slice. Default is every case.
+        :return: numpy.ndarray of shape [case, day] (or [day] for one case), NaN where not recorded.
+        """
+        if key not in DAILY_KEYS:
+            raise KeyError(f'unknown daily key {key}, expected one of {DAILY_KEYS}')
+        recorded = self.recorded[case]
+        return np.where(recorded, self._array('daily_' + key)[case], np.nan)
+
+    def refresh(self):
+        """Count replications recorded since the previous refresh in the statistics of every daily key.
+
+        :return: list of (case, day) pairs newly recorded, in order of case and day.
+        """
+        new = self.recorded & ~self.seen
+        cases, days = np.nonzero(new)
+        if len(cases):
+            np.add.at(self._count, cases, 1)
+            for key in DAILY_KEYS:
+                values = self._array('daily_' + key)[cases, days]
+                np.add.at(self._sums[key], cases, values)
+                np.add.at(self._squares[key], cases, values * values)
+            self.seen |= new
+        return list(zip(cases.tolist(), days.tolist()))
+
+    def ranking(self, key='profit', ascending=False, confidence=0.95):
+        """Cases with at least one recorded day, ranked by the mean of a daily key.
+
+        :param key: Daily key. (see result_store.DAILY_KEYS)
+        :param ascending: If True, the lowest mean ranks first. (ex: for 'waiting_time')
+        :param confidence: Confidence level of the half width column.
+        :return: pandas.DataFrame indexed by case number (1-based) with columns days, mean, std
+            and half_width of the confidence interval of the mean (NaN with one day).
+        """
+        self.refresh()
+        cases = np.flatnonzero(self._count)
+        n = self._count[cases]
+        mean = self._sums[key][cases] / n
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = np.maximum(self._squares[key][cases] - n * mean * mean, 0) / (n - 1)
+        std = np.sqrt(np.where(n > 1, variance, np.nan))
+        half_width = np.array([t_quantile(confidence, days - 1) if days > 1 else math.nan for days in n]) \
+            * std / np.sqrt(n)
+        ranking_df = pd.DataFrame({'days': n, 'mean': mean, 'std': std, 'half_width': half_width},
+                                  index=pd.Index(cases + 1, name='case'))
+        return ranking_df.sort_values('mean', ascending=ascending, kind='stable')
+
+    def diff(self, case, other, key='profit', confidence=0.95):
+        """Paired difference of a daily key between two cases over the days recorded for both.
+
+        With common random numbers both cases see the same passengers on the same day,
+        so the paired difference is far less noisy than the difference of means.
+
+        :param case: Case index (0-based).
+        :param other: Case index (0-based) subtracted from case.
+        :param key: Daily key. (see result_store.DAILY_KEYS)
+        :param confidence: Confidence level of the half width.
+        :return: dict of days, mean, std and half_width of case - other. NaN without enough common days.
+        """
+        recorded = self.recorded
+        days = np.flatnonzero(recorded[case] & recorded[other])
+        values = self._array('daily_' + key)
+        differences = np.asarray(values[case, days], dtype=float) - values[other, days]
+        n = len(days)
+        std = float(differences.std(ddof=1)) if n > 1 else math.nan
+        return {
+            'days': n,
+            'mean': float(differences.mean()) if n else math.nan,
+            'std': std,
+            'half_width': t_quantile(confidence, n - 1) * std / math.sqrt(n) if n > 1 else math.nan,
+        }
+
+    def hourly_diff(self, metric, case, other):
+        """Average hourly difference of a metric between two cases over the days recorded for both.
+
+        Only the rows of the two cases are read.
+
+        :param metric: Metric name. (see result_store.METRICS)
+        :param case: Case index (0-based).
+        :param other: Case index (0-based) subtracted from case.
+        :return: numpy.ndarray of shape [hour, station or bus]. NaN without common days.
+        """
+        recorded = self.recorded
+        days = np.flatnonzero(recorded[case] & recorded[other])
+        if len(days) == 0:
+            return np.full(self._array(metric).shape[2:], np.nan)
+        return (self.hourly(metric, case, days) - self.hourly(metric, other, days)).mean(axis=0)
+
+    def follow(self, poll_interval=1.0, idle_timeout=60.0):
+        """Refresh until every replication is recorded or nothing new is recorded for idle_timeout seconds.
+
+        :param poll_interval: Seconds between refreshes.
+        :param idle_timeout: Seconds without new replications after which following stops.
+        :return: generator of lists of newly recorded (case, day) pairs. (see refresh)
+        """
+        last_new = time.monotonic()
+        while True:
+            new = self.refresh()
+            if new:
+                last_new = time.monotonic()
+                yield new
+            if self.seen.all() or time.monotonic() - last_new > idle_timeout:
+                return
+            time.sleep(poll_interval)
@@ -1,177 +1,182 @@
-from bus_system import *
+from sweep import *
+from result_store import WAITING_KEYS, ResultStore
+from result_cache import ResultCache
+from checkpoint import Checkpoint
+from progress import ProgressFeed
+from profiler import SimulationProfile
+from fluid import screen_cases
+from replication import ReplicationController, run_adaptive_sweep
 import numpy as np
 import pandas as pd
 import os
 from tqdm import tqdm
 
 # Global Variables -------------------
-n_days = 10
+n_days = 10  # maximum number of days per case if adaptive_replication is True
 cost_per_minute = 66.8379
 discount = 0.8  # considering transfer
+seed = 0
+n_workers = None  # None uses every core, 1 runs serially
+common_random_numbers = True  # every case of the same day sees the same passengers
+buffered_sampling = True  # draw random variates from numpy blocks
+compact_queues = True  # count passengers instead of creating Passenger objects
+dwell_time = 0  # minutes a bus stays at a station per passenger who gets off or boards
+save_csv = True  # also write hourly summaries of the last day to output/case{n}/*.csv
+results_mmap_dir = None  # directory of memory-mapped .npy results, None keeps them in memory
+screen_top_k = None  # simulate only the k best cases by fluid estimate, None simulates every case
+adaptive_replication = False  # stop simulating a case once its confidence intervals are tight enough
+min_days = 3  # minimum number of days per case if adaptive_replication is True
+target_precision = 0.01  # target half width of 95% confidence intervals relative to the mean
+cache_dir = 'output/cache'  # directory of simulated days reused by later runs, None disables the cache
+cache_max_mb = 256  # days least recently used are deleted beyond this size
+profile = False  # time every process type and write output/profile.csv (simulates every day, ignoring cache)
+checkpoint_dir = 'output/checkpoint'  # finished replications are saved here, and a rerun resumes from them
+progress_path = 'output/progress.jsonl'  # live progress feed (tail -f), None disables it
+progress_port = None  # also serve the progress feed on this port of 127.0.0.1, None disables it
 # ------------------------------------
 
-total_bus_idt_df = pd.read_csv("bus_data/bus_idt.csv")
-n_cases = int(len(total_bus_idt_df.columns)/2)
-final_results = [[], [], [], [], []]
-
-psn_iat_df = pd.read_csv("passenger_data/psn_iat.csv")
-psn_idt_df = pd.read_csv("passenger_data/psn_idt.csv")
-bus_iat_df = pd.read_csv("bus_data/bus_iat.csv")
-bus_info_df = pd.read_csv("bus_data/bus_info.csv")
-
-age_fee_df = pd.read_csv('passenger_data/age_ratio_and_fee.csv')
-large_bus_cost_df = pd.read_csv('bus_data/costs_large.csv')
-small_bus_cost_df = pd.read_csv('bus_data/costs_small.csv')
-
-best_case = -1
-best_profit = -100000000
-best_waiting_time = -1
-best_renege = -1
-best_waiting_cost_waste = -1
-best_net_profit = -1
-
-for case in range(n_cases):
-
-    total_profit = 0
-    total_waiting_time = 0
-    total_renege = 0
-    total_net_profit = 0
-    total_waiting_cost_waste = 0
-    os.makedirs('output/case' + str(case + 1), exist_ok=True)
-    print(f'\nCase {case + 1}')
-
-    for day in tqdm(range(n_days)):
-        # system setup
-        n_stations = 9
-        time_zone = 18
-        SIM_TIME = 60 * time_zone + 1
-
-        bus_idt_df = total_bus_idt_df.iloc[:, [2*case + 1, 2*case + 2]]
-        df_list = [psn_iat_df, psn_idt_df, bus_iat_df, bus_idt_df]
-
-        env = simpy.Environment()
-        stations = [Station(env, f'S{i}', distance) for i, distance in enumerate(bus_iat_df['distance'])]
-        stations[-1].is_terminal = True
-        buses = [Bus(env, row, stations) for i, row in bus_info_df.iterrows()]
-
-        hour_summaries = [[], [], [], [], [], [], []]
-
-        env.process(dispatch_buses(env, bus_idt_df, buses))
-        env.process(dist_change(env, stations, buses, df_list))
-        env.process(monitor(env, stations, buses, hour_summaries))
-        env.run(until=SIM_TIME)
-
-# 3     print(f'simulation end')
-
-        # statistics and cost calculation
-
-        daily_passengers = 0
-        daily_driving_time = 0
-        daily_driving_distance = 0
-        daily_fee = 0
-        daily_bus_cost = 0
-        daily_total_waiting_time = 0
-        daily_waiting_cost_waste = 0
-
-        for bus in buses:
-# 4         print(f'{bus.name} transported {bus.board_cnt} passengers during {bus.driving_time} min')
-            daily_passengers += bus.board_cnt
-            daily_driving_time += bus.driving_time
-            daily_driving_distance += bus.driving_distance
-
-        for station in stations:
-            if len(station.psn_waiting_time) > 0:
-                daily_total_waiting_time += sum(station.psn_waiting_time)
-            if station.n_psn_renege > 0:
-# 5             print(f'{station.n_psn_renege} passengers reneged at {station.name}')
-                total_renege += station.n_psn_renege
-
-# 6     print(f'daily passengers: {daily_passengers}')
-# 7     print(f'daily driving time: {daily_driving_time}')
-# 8     print(f'daily driving distance: {daily_driving_distance}')
-
-        df_columns = psn_idt_df.columns.drop(['station', 'average', 'std'])
-        csv_names = ['board', 'depart', 'renege', 'wait', 'bus users', 'drive time', 'drive distance']
-        for summary, filename in zip(hour_summaries, csv_names):
-            summary_df = pd.DataFrame(np.transpose(np.array(summary)), columns=df_columns)
-            file_dir = 'output/case' + str(case + 1) + '/' + filename + '.csv'
-            summary_df.to_csv(file_dir, sep=',')
-
-        # calculate total fee
-        for key, value in age_fee_df.iteritems():
-            daily_fee += daily_passengers * value[0] * value[1] * discount
-
-# 9     print(f'daily fee: {round(daily_fee)} won')
-
-        # calculate bus operating cost
-        for bus in buses:
-            if bus.category == 'medium':
-                bus.calculate_cost(small_bus_cost_df)
-            else:
-                bus.calculate_cost(large_bus_cost_df)
-
-# 10        print(f'{bus.name} operating cost : {bus.cost} won')
-            daily_bus_cost += bus.cost
-
-# 11    print(f'sum of daily bus operating cost: {daily_bus_cost} won')
-        daily_profit = daily_fee - daily_bus_cost
-# 12    print(f'daily profit: {round(daily_profit)} won')
-        total_profit += daily_profit
-
-# 13    print(f'sum of waiting time: {daily_total_waiting_time} minutes')
-        daily_average_waiting_time = daily_total_waiting_time / daily_passengers
-# 14    print(f'daily average waiting time: {daily_average_waiting_time} minutes')
-        total_waiting_time += daily_average_waiting_time
-
-        daily_waiting_cost_waste = daily_total_waiting_time * cost_per_minute
-        daily_net_profit = daily_profit - daily_waiting_cost_waste
-# 15    print(f'net profit concidering waiting time: {round(daily_net_profit)}')
-        total_waiting_cost_waste += daily_waiting_cost_waste
-        total_net_profit += daily_net_profit
-
-    average_profit = total_profit/n_days
-    average_waiting_time = total_waiting_time / n_days
-    average_renege = total_renege / n_days
-    average_waiting_cost_waste = total_waiting_cost_waste / n_days
-    average_net_profit = total_net_profit / n_days
-    print(f'{n_days}days average profit: {average_profit} won')
-    print(f'{n_days}days average waiting: {average_waiting_time} minutes')
-    print(f'{n_days}days average renege: {average_renege}')
-    print(f'{n_days}days average waste: {average_waiting_cost_waste} won')
-    print(f'{n_days}days average net profit: {average_net_profit} won')
-
-    # append results to final_results.csv
-    final_results[0].append(case + 1)
-    final_results[1].append(average_profit)
-    final_results[2].append(average_waiting_time)
-    final_results[3].append(average_renege)
+if __name__ == '__main__':
+    inputs = load_inputs()
+    n_cases = count_cases(inputs)
+    final_results = [[], [], [], [], [], [], [], [], []]
+
+    tables = inputs['tables']
+    store = ResultStore(n_cases, n_days, tables.n_zones, tables.n_stations, len(tables.bus_info),
+                        results_mmap_dir)
+
+    # simulate every (case, day) replication, in parallel unless n_workers == 1
+    options = {
+        'seed': seed,
+        'cost_per_minute': cost_per_minute,
+        'discount': discount,
+        'common_random_numbers': common_random_numbers,
+        'buffered_sampling': buffered_sampling,
+        'compact_queues': compact_queues,
+        'dwell_time': dwell_time,
+        'profile': profile,
+    }
+    cache = None if cache_dir is None or profile else ResultCache(inputs, cache_dir, cache_max_mb * 2 ** 20)
+    checkpoint = None if checkpoint_dir is None else Checkpoint(checkpoint_dir, inputs, options)
+    resumed = {} if checkpoint is None else checkpoint.load()
+    cases = range(n_cases)
+    if screen_top_k is not None:  # pre-screen cases with the fluid model
+        cases = sorted(screen_cases(inputs, cases, options, screen_top_k))
+        print(f'cases selected by fluid estimate: {[case + 1 for case in cases]}')
+    if adaptive_replication:
+        controller = ReplicationController(cases, min_days, n_days, target_precision)
+        sweep = run_adaptive_sweep(inputs, controller, options, n_workers, cache, resumed)
+    else:
+        sweep = run_sweep(inputs, cases, n_days, options, n_workers, cache, resumed)
+    if resumed:
+        print(f'{len(resumed)} replications resumed from {checkpoint_dir}')
+    os.makedirs('output', exist_ok=True)
+    feed = ProgressFeed(len(cases) * n_days, progress_path, progress_port)
+    if progress_port is not None:
+        print(f'progress feed on 127.0.0.1:{feed.port}')
+    run_profile = SimulationProfile()
+    for daily_result in tqdm(sweep, total=len(cases) * n_days):
+        store.record(daily_result)
+        is_resumed = resumed.get((daily_result['case'], daily_result['day'])) is daily_result
+        if checkpoint is not None and not is_resumed:
+            checkpoint.save(daily_result)
+        feed.update(daily_result, is_resumed)
+        if daily_result['profile'] is not None:
+            run_profile.merge(daily_result['profile'])
+    feed.close()
+
+    # every day of every case is kept in output/results.npz
+    store.save('output/results.npz')
+    if checkpoint is not None:  # the run is complete, nothing to resume
+        checkpoint.clear()
+    if save_csv:  # hourly summaries of the last day are kept in output/case{n}
+        store.export_csv('output', tables.zone_names)
+    if profile:  # time per process type and longest boarding queue per station of the whole run
+        profile_df = run_profile.summary()
+        profile_df.to_csv('output/profile.csv', sep=',')
+        queue_df = pd.DataFrame({'high water': pd.Series(run_profile.queue_high_water)})
+        queue_df.to_csv('output/queue_high_water.csv', sep=',')
+        print(profile_df)
+
+    best_case = -1
+    best_profit = -100000000
+    best_waiting_time = -1
+    best_renege = -1
+    best_waiting_cost_waste = -1
+    best_net_profit = -1
+    best_waiting_quantiles = [-1] * len(WAITING_KEYS)
+
+    for case in cases:
+
+        total_profit = 0
+        total_waiting_time = 0
+        total_renege = 0
+        total_net_profit = 0
+        total_waiting_cost_waste = 0
+        total_waiting_quantiles = [0] * len(WAITING_KEYS)
+        print(f'\nCase {case + 1}')
+
+        case_days = int(store.recorded[case].sum())
+        for day in np.flatnonzero(store.recorded[case]):
+            total_profit += float(store.daily['profit'][case, day])
+            total_waiting_time += float(store.daily['waiting_time'][case, day])
+            total_renege += int(store.daily['renege'][case, day])
+            total_waiting_cost_waste += float(store.daily['waiting_cost_waste'][case, day])
+            total_net_profit += float(store.daily['net_profit'][case, day])
+            for i, key in enumerate(WAITING_KEYS):
+                total_waiting_quantiles[i] += float(store.daily[key][case, day])
+
+        average_profit = total_profit / case_days
+        average_waiting_time = total_waiting_time / case_days
+        average_renege = total_renege / case_days
+        average_waiting_cost_waste = total_waiting_cost_waste / case_days
+        average_net_profit = total_net_profit / case_days
+        average_waiting_quantiles = [total / case_days for total in total_waiting_quantiles]
+        print(f'{case_days}days average profit: {average_profit} won')
+        print(f'{case_days}days average waiting: {average_waiting_time} minutes')
+        print(f'{case_days}days average renege: {average_renege}')
+        print(f'{case_days}days average waste: {average_waiting_cost_waste} won')
+        print(f'{case_days}days average net profit: {average_net_profit} won')
+        print(f'{case_days}days average waiting p50/p90/p99: {average_waiting_quantiles[1:]} minutes')
+
+        # append results to final_results.csv
+        final_results[0].append(case + 1)
+        final_results[1].append(average_profit)
+        final_results[2].append(average_waiting_time)
+        final_results[3].append(average_renege)
+        # final_results[3].append(average_waiting_cost_waste)
+        final_results[4].append(average_net_profit)
+        for i, value in enumerate(average_waiting_quantiles):
+            final_results[5 + i].append(value)
+
+        if average_profit > best_profit:
+            best_case = case + 1
+            best_profit = average_profit
+            best_waiting_time = average_waiting_time
+            best_renege = average_renege
+            best_waiting_cost_waste = average_waiting_cost_waste
+            best_net_profit = average_net_profit
+            best_waiting_quantiles = average_waiting_quantiles
+
+    print('')
+    print(f'best case : case{best_case}')
+    print(f'average profit: {best_profit} won')
+    print(f'average waiting: {best_waiting_time} minutes')
+    print(f'average renege: {best_renege}')
+    print(f'average waste: {best_waiting_cost_waste}')
+    print(f'average net profit: {best_net_profit}')
+    print(f'average waiting p50/p90/p99: {best_waiting_quantiles[1:]} minutes')
+
+    final_results[0].append('best : ' + str(best_case))
+    final_results[1].append(best_profit)
+    final_results[2].append(best_waiting_time)
+    final_results[3].append(best_renege)
     # final_results[3].append(average_waiting_cost_waste)
-    final_results[4].append(average_net_profit)
-
-    if average_profit > best_profit:
-        best_case = case + 1
-        best_profit = average_profit
-        best_waiting_time = average_waiting_time
-        best_renege = average_renege
-        best_waiting_cost_waste = average_waiting_cost_waste
-        best_net_profit = average_net_profit
-
-print('')
-print(f'best case : case{best_case}')
-print(f'average profit: {best_profit} won')
-print(f'average waiting: {best_waiting_time} minutes')
-print(f'average renege: {best_renege}')
-print(f'average waste: {best_waiting_cost_waste}')
-print(f'average net profit: {best_net_profit}')
-
-final_results[0].append('best : ' + str(best_case))
-final_results[1].append(best_profit)
-final_results[2].append(best_waiting_time)
-final_results[3].append(best_renege)
-# final_results[3].append(average_waiting_cost_waste)
-final_results[4].append(best_net_profit)
-
-# print final results to csv file
-result_col = ['case', 'average profit', 'average waiting time', 'average renege', 'average net profit']
-result_df = pd.DataFrame(np.transpose(np.array(final_results)), columns=result_col)
-result_df.to_csv('output/final_results.csv', sep=',', index=False)
+    final_results[4].append(best_net_profit)
+    for i, value in enumerate(best_waiting_quantiles):
+        final_results[5 + i].append(value)
+
+    # print final results to csv file
+    result_col = ['case', 'average profit', 'average waiting time', 'average renege', 'average net profit',
+                  'waiting time std', 'waiting time p50', 'waiting time p90', 'waiting time p99']
+    result_df = pd.DataFrame(np.transpose(np.array(final_results)), columns=result_col)
+    result_df.to_csv('output/final_results.csv', sep=',', index=False)
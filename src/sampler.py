@@ -0,0 +1,41 @@
+
+class NormalSampler:
+    """Buffered normal random variate stream for DES simulation.
+
+    Drop-in replacement of random.Random for the normalvariate calls in bus_system.
+    Standard normal variates are drawn from numpy in blocks and scaled by the distribution
+    parameters of each call, so a station or bus whose distribution changes every hour (dist_change)
+    keeps using the same buffer and no variate is wasted.
+    Returned values follow exactly the same normal distribution as random.normalvariate.
+
+    Attributes
+    ----------
+    generator : numpy.random.Generator
+        Numpy generator which draws blocks of standard normal variates.
+    block_size : int
+        Number of variates drawn per refill.
+
+    """
+    def __init__(self, generator, block_size=1024):
+        """
+        :param generator: numpy.random.Generator of this stream.
+        :param block_size: Number of variates drawn per refill.
+        """
+        self.generator = generator
+        self.block_size = block_size
+        self._block = []
+        self._next = 0
+
+    def normalvariate(self, mu, sigma):
+        """Return the next normal variate of the stream.
+
+        :param mu: Mean of the normal distribution.
+        :param sigma: Standard deviation of the normal distribution.
+        :return: float
+        """
+        if self._next == len(self._block):  # buffer used up, draw the next block lazily
+            self._block = self.generator.standard_normal(self.block_size).tolist()
+            self._next = 0
+        z = self._block[self._next]
+        self._next += 1
+        return mu + sigma * z
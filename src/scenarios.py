@@ -0,0 +1,113 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from sweep import DEFAULT_OPTIONS, count_cases, load_inputs, load_passenger_profiles, run_tasks
+
+# Global Variables -------------------
+profiles = ['after_corona', 'before_corona']  # passenger data folders, each a demand profile
+multipliers = [1, 1.5, 2]  # passenger demand multipliers applied to every profile
+n_days = 5  # days per (case, scenario)
+seed = 0
+n_workers = None  # None uses every core, 1 runs serially
+key = 'profit'  # daily statistic compared across scenarios, higher is better
+# ------------------------------------
+
+
+def scenario_name(profile, multiplier):
+    """Name of a demand scenario. (ex: 'before_corona x1.5')"""
+    return f'{profile} x{multiplier:g}'
+
+
+def add_scenarios(inputs, profiles, multipliers):
+    """Compile passenger tables of every (profile, multiplier) scenario into inputs.
+
+    Every profile folder is read once. A multiplier of k divides inter-arrival and inter-departure
+    times by k, so k times as many passengers come. Scenario tables travel to each worker once with
+    the other input tables, and tasks select them by name with the 'scenario' option.
+
+    :param inputs: dict returned by sweep.load_inputs.
+    :param profiles: List of passenger data folders. (ex: ['after_corona', 'before_corona'])
+    :param multipliers: List of demand multipliers.
+    :return: (inputs extended by 'scenarios', a dict of (psn_iat, psn_idt) keyed by scenario name,
+        list of scenario names in order of profiles then multipliers)
+    """
+    if any(multiplier <= 0 for multiplier in multipliers):
+        raise ValueError(f'demand multipliers must be positive: {multipliers}')
+    tables = load_passenger_profiles(profiles, inputs['tables'])
+    scenarios = {}
+    for profile in profiles:
+        psn_iat, psn_idt = tables[profile]
+        for multiplier in multipliers:
+            scaled_iat, scaled_idt = psn_iat / multiplier, psn_idt / multiplier
+            scaled_iat.flags.writeable = scaled_idt.flags.writeable = False
+            scenarios[scenario_name(profile, multiplier)] = scaled_iat, scaled_idt
+    return {**inputs, 'scenarios': {**inputs.get('scenarios', {}), **scenarios}}, list(scenarios)
+
+
+def run_scenarios(inputs, cases, n_days, names, options, n_workers=None, cache=None, keys=('profit',)):
+    """Simulate every (case, scenario, day) replication in one parallel sweep.
+
+    Days share random numbers across cases as in sweep.run_sweep, so cases are compared under the
+    same passengers within each scenario.
+
+    :param inputs: dict returned by add_scenarios.
+    :param cases: Iterable of case indices (0-based).
+    :param n_days: Number of days per (case, scenario).
+    :param names: List of scenario names in inputs['scenarios'].
+    :param options: dict of simulation options passed to sweep.simulate_day.
+    :param n_workers: Number of worker processes. None uses every core, 1 runs in this process.
+    :param cache: result_cache.ResultCache of simulated days, or None.
+    :param keys: Daily statistics to average.
+    :return: dict of robustness matrices keyed by keys. A matrix is a pandas.DataFrame of the mean
+        daily statistic indexed by case number (1-based) with one column per scenario.
+    """
+    cases = list(cases)
+    scenario_options = {name: {**options, 'scenario': name} for name in names}
+    tasks = [(case, day, scenario_options[name]) for name in names for case in cases for day in range(n_days)]
+    rows = {case: i for i, case in enumerate(cases)}
+    columns = {name: j for j, name in enumerate(names)}
+    totals = {key: np.zeros((len(cases), len(names))) for key in keys}
+    for daily_result in run_tasks(inputs, tasks, n_workers, cache):
+        i, j = rows[daily_result['case']], columns[daily_result['scenario']]
+        for key in keys:
+            totals[key][i, j] += daily_result[key]
+    index = pd.Index([case + 1 for case in cases], name='case')
+    return {key: pd.DataFrame(total / n_days, index=index, columns=names) for key, total in totals.items()}
+
+
+def robustness(matrix, higher_is_better=True):
+    """Summarize how well each case does across scenarios.
+
+    Regret of a case in a scenario is how far it falls behind the best case of that scenario.
+
+    :param matrix: Robustness matrix returned by run_scenarios.
+    :param higher_is_better: If False, lower values are better. (ex: for 'waiting_time')
+    :return: pandas.DataFrame indexed by case with columns mean, worst and max_regret,
+        sorted by max_regret then worst.
+    """
+    values = matrix if higher_is_better else -matrix
+    summary_df = pd.DataFrame({
+        'mean': matrix.mean(axis=1),
+        'worst': matrix.min(axis=1) if higher_is_better else matrix.max(axis=1),
+        'max_regret': (values.max(axis=0) - values).max(axis=1),
+    })
+    return summary_df.sort_values(['max_regret', 'worst'], ascending=[True, not higher_is_better])
+
+
+if __name__ == '__main__':
+    inputs, names = add_scenarios(load_inputs(), profiles, multipliers)
+    options = {**DEFAULT_OPTIONS, 'seed': seed}
+    matrices = run_scenarios(inputs, range(count_cases(inputs)), n_days, names, options, n_workers,
+                             keys=(key,))
+    matrix = matrices[key]
+    summary_df = robustness(matrix)
+
+    os.makedirs('output', exist_ok=True)
+    matrix.to_csv(f'output/robustness_{key}.csv', sep=',')
+    summary_df.to_csv(f'output/robustness_{key}_summary.csv', sep=',')
+    print(matrix.round(1))
+    print(summary_df.round(1))
+    best_case = summary_df.index[0]
+    print(f'most robust case: case{best_case} (max regret {summary_df["max_regret"].iloc[0]:.1f})')
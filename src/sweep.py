@@ -0,0 +1,386 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import simpy
+
+from bus_system import Bus, Counters, RandomStreams, Route, Station, dispatch_buses, dist_change, monitor
+from economics import CostModel
+from online_stats import SUMMARY_KEYS, WaitingTimeStats, summarize
+from param_tables import ParamTables, passenger_tables
+from profiler import ProfilingEnvironment
+
+CSV_NAMES = ['board', 'depart', 'renege', 'wait', 'bus users', 'drive time', 'drive distance']
+
+DEFAULT_OPTIONS = {
+    'seed': 0,  # seed of the whole sweep
+    'cost_per_minute': 66.8379,  # time value of one minute of passenger waiting (won/min)
+    'discount': 0.8,  # discount factor applied to passenger fees
+    'common_random_numbers': True,  # every case of the same day shares random number streams
+    'buffered_sampling': True,  # draw normal variates from numpy blocks (sampler.NormalSampler)
+    'compact_queues': True,  # store waiting passengers as timestamps and bus passengers as a count
+    'dwell_time': 0,  # minutes a bus stays at a station per passenger who gets off or boards
+    'timetable': None,  # numpy.ndarray [zone, 2] of bus IDT (mean, std) replacing the case's timetable
+    'fleet': None,  # list of bus_info dicts replacing bus_info.csv
+    'scenario': None,  # name of demand scenario in inputs['scenarios'] replacing passenger tables (scenarios.py)
+    'profile': False,  # time every process type and record queue high-water marks (profiler.py)
+}
+
+_worker_inputs = None  # input tables of a worker process, set by _init_worker
+
+
+def load_inputs():
+    """Read every input csv file a sweep needs and compile simulation parameters.
+
+    bus_data/routes.csv is optional. Without it, bus_iat.csv is the only route.
+
+    :return: dict of pandas.DataFrame keyed by table name, and param_tables.ParamTables keyed by 'tables'.
+    """
+    inputs = {
+        'total_bus_idt': pd.read_csv("bus_data/bus_idt.csv"),
+        'psn_iat': pd.read_csv("passenger_data/psn_iat.csv"),
+        'psn_idt': pd.read_csv("passenger_data/psn_idt.csv"),
+        'bus_iat': pd.read_csv("bus_data/bus_iat.csv"),
+        'routes': pd.read_csv("bus_data/routes.csv") if os.path.exists("bus_data/routes.csv") else None,
+        'bus_info': pd.read_csv("bus_data/bus_info.csv"),
+        'age_fee': pd.read_csv('passenger_data/age_ratio_and_fee.csv'),
+        'large_bus_cost': pd.read_csv('bus_data/costs_large.csv'),
+        'small_bus_cost': pd.read_csv('bus_data/costs_small.csv'),
+    }
+    inputs['tables'] = ParamTables(inputs['psn_iat'], inputs['psn_idt'], inputs['bus_iat'],
+                                   inputs['total_bus_idt'], inputs['bus_info'], inputs['routes'])
+    return inputs
+
+
+def load_passenger_profiles(names, tables):
+    """Read and compile passenger tables of every distinct profile folder.
+
+    :param names: List of folder names containing psn_iat.csv and psn_idt.csv. (ex: 'before_corona')
+    :param tables: param_tables.ParamTables of the simulated network.
+    :return: dict of (psn_iat, psn_idt) keyed by folder name. (see param_tables.passenger_tables)
+    """
+    profiles = {}
+    for name in dict.fromkeys(names):
+        psn_iat, psn_idt = passenger_tables(pd.read_csv(os.path.join(name, 'psn_iat.csv')),
+                                            pd.read_csv(os.path.join(name, 'psn_idt.csv')), tables.n_zones)
+        if psn_iat.shape[1] != tables.n_stations:
+            raise ValueError(f'{name} has {psn_iat.shape[1]} stations instead of {tables.n_stations}')
+        profiles[name] = psn_iat, psn_idt
+    return profiles
+
+
+def count_cases(inputs):
+    """Number of timetable cases, one (mean, std) column pair per case in bus_idt.csv.
+
+    :param inputs: dict returned by load_inputs.
+    """
+    return inputs['tables'].n_cases
+
+
+def replication_seed(seed, case, day, common_random_numbers=True):
+    """Derive the seed of one (case, day) replication from the sweep seed.
+
+    With common random numbers, every case of the same day gets the same seed. Cases are then
+    compared under identical passenger demand, which needs far fewer days to rank them.
+
+    :param seed: Seed of the whole sweep.
+    :param case: Case index (0-based).
+    :param day: Day index (0-based).
+    :param common_random_numbers: If True, the seed does not depend on case.
+    :return: int seed for the replication.
+    """
+    entropy = [seed, day] if common_random_numbers else [seed, day, case]
+    return int(np.random.SeedSequence(entropy).generate_state(1)[0])
+
+
+def simulation_options(options):
+    """Fill missing simulation options with DEFAULT_OPTIONS."""
+    return {**DEFAULT_OPTIONS, **options}
+
+
+def build_network(env, inputs, case, options, streams, passenger_tables=None, cyclic=False):
+    """Create stations, routes and buses of a timetable case and start every process but monitor.
+
+    :param env: simpy.Environment to simulate in. If it has a profile, buses are instrumented.
+    :param inputs: dict returned by load_inputs.
+    :param case: Case index (0-based).
+    :param options: dict of simulation options with every key of DEFAULT_OPTIONS.
+    :param streams: bus_system.RandomStreams of the replication.
+    :param passenger_tables: Function of day index returning (psn_iat, psn_idt) arrays. (see bus_system.dist_change)
+        Default takes the tables of options['scenario'] if it is set.
+    :param cyclic: If True, the timetable repeats every day. (see bus_system.dispatch_buses)
+    :return: (list of stations, list of buses, bus_system.Counters of both)
+    """
+    tables = inputs['tables']
+    profile = getattr(env, 'profile', None)
+    compact = options['compact_queues']
+    if passenger_tables is None and options['scenario'] is not None:
+        def passenger_tables(day, scenario_tables=inputs['scenarios'][options['scenario']]):
+            return scenario_tables
+    fleet = tables.bus_info if options['fleet'] is None else options['fleet']
+    counters = Counters(tables.n_stations, len(fleet))
+    stations = [Station(env, f'S{i}', streams, compact, counters, i) for i in range(tables.n_stations)]
+    routes = [Route(route['name'], [stations[i] for i in route['stations']], route['distance'], route['bus_iat'])
+              for route in tables.routes]
+    routes_by_name = {route.name: route for route in routes}
+    buses = [Bus(env, info, routes_by_name[info.get('route', routes[0].name)], streams, compact,
+                 options['dwell_time'], counters, i) for i, info in enumerate(fleet)]
+    if profile is not None:
+        profile.instrument_buses(buses)
+        for station in stations:
+            profile.observe_queue(station)
+    bus_idt = tables.bus_idt[case] if options['timetable'] is None else np.asarray(options['timetable'])
+
+    for route in routes:  # every route dispatches its own fleet by the same timetable
+        route_buses = [bus for bus in buses if bus.route is route]
+        if route_buses:
+            stream_key = 'dispatcher' if route is routes[0] else route.name + '/dispatcher'
+            env.process(dispatch_buses(env, bus_idt, route_buses, streams.stream(stream_key), cyclic))
+    env.process(dist_change(env, stations, routes, buses, tables, bus_idt, passenger_tables))
+    return stations, buses, counters
+
+
+def operate_day(inputs, case, day, options, env=None):
+    """Simulate one day of one timetable case without any cost calculation.
+
+    :param inputs: dict returned by load_inputs.
+    :param case: Case index (0-based).
+    :param day: Day index (0-based).
+    :param options: dict of simulation options. Missing keys take values of DEFAULT_OPTIONS.
+    :param env: New simpy.Environment to simulate in. (ex: profiler.CountingEnvironment)
+        Default is profiler.ProfilingEnvironment if options['profile'] is True, or simpy.Environment.
+    :return: dict of daily operation records of buses and stations, hourly summaries
+        (list of 7 arrays of shape [hour, station or bus], see bus_system.monitor),
+        waiting time statistics of the whole network (waiting_summary), of each station
+        (station_waiting_summary, shape [station, stat]) and of each hour and station
+        (hour_waiting_summary, shape [hour, station, stat]) with stats in order of online_stats.SUMMARY_KEYS,
+        and profiler.SimulationProfile of the day (None unless env profiles).
+    """
+    options = simulation_options(options)
+    streams = RandomStreams(replication_seed(options['seed'], case, day, options['common_random_numbers']),
+                            buffered=options['buffered_sampling'])
+
+    # system setup
+    tables = inputs['tables']
+    SIM_TIME = 60 * tables.n_zones + 1
+
+    if env is None:
+        env = ProfilingEnvironment() if options['profile'] else simpy.Environment()
+    profile = getattr(env, 'profile', None)
+    stations, buses, counters = build_network(env, inputs, case, options, streams)
+
+    hour_summaries = [np.zeros((tables.n_zones, tables.n_stations)) for _ in range(4)] \
+        + [np.zeros((tables.n_zones, len(buses))) for _ in range(3)]
+    waiting_summaries = np.zeros((tables.n_zones, tables.n_stations, len(SUMMARY_KEYS)))
+    env.process(monitor(env, counters, hour_summaries, waiting_summaries=waiting_summaries))
+    env.run(until=SIM_TIME)
+    if profile is not None:
+        for station in stations:
+            profile.observe_queue(station)
+
+# 3 print(f'simulation end')
+
+    # statistics
+    daily_passengers = 0
+    daily_driving_time = 0
+    daily_driving_distance = 0
+    daily_total_waiting_time = 0
+    daily_renege = 0
+    daily_waiting_stats = WaitingTimeStats()
+
+    for bus in buses:
+# 4     print(f'{bus.name} transported {bus.board_cnt} passengers during {bus.driving_time} min')
+        daily_passengers += int(bus.board_cnt)
+        daily_driving_time += float(bus.driving_time)
+        daily_driving_distance += float(bus.driving_distance)
+
+    for station in stations:
+        daily_total_waiting_time += station.waiting_stats.total
+        daily_waiting_stats.merge(station.waiting_stats)
+        if station.n_psn_renege > 0:
+# 5         print(f'{station.n_psn_renege} passengers reneged at {station.name}')
+            daily_renege += int(station.n_psn_renege)
+
+# 6 print(f'daily passengers: {daily_passengers}')
+# 7 print(f'daily driving time: {daily_driving_time}')
+# 8 print(f'daily driving distance: {daily_driving_distance}')
+
+    return {
+        'case': case,
+        'day': day,
+        'scenario': options['scenario'],
+        'passengers': daily_passengers,
+        'buses': [{'name': bus.name, 'category': bus.category, 'fuel': bus.fuel, 'board_cnt': int(bus.board_cnt),
+                   'driving_time': float(bus.driving_time), 'driving_distance': float(bus.driving_distance)}
+                  for bus in buses],
+        'total_waiting_time': daily_total_waiting_time,
+        'waiting_summary': daily_waiting_stats.summary(),
+        'station_waiting_summary': summarize([station.waiting_stats for station in stations]),
+        'renege': daily_renege,
+        'hour_summaries': hour_summaries,
+        'hour_waiting_summary': waiting_summaries,
+        'profile': profile,
+    }
+
+
+def price_day(inputs, operation, options):
+    """Calculate fee, bus operating cost and profit of a simulated day.
+
+    Only cost tables and cost options are used, so a day can be priced again under new costs
+    without simulating it again.
+
+    :param inputs: dict returned by load_inputs.
+    :param operation: dict returned by operate_day.
+    :param options: dict of simulation options. Missing keys take values of DEFAULT_OPTIONS.
+    :return: dict of operate_day extended by daily statistics and costs.
+    """
+    options = simulation_options(options)
+    cost_model = CostModel.from_inputs(inputs, options)
+    daily = {key: values[0] for key, values in cost_model.price_operations([operation]).items()}
+
+# 9 print(f"daily fee: {round(float(daily['fee']))} won")
+# 11 print(f"sum of daily bus operating cost: {daily['bus_cost']} won")
+# 12 print(f"daily profit: {round(float(daily['profit']))} won")
+# 13 print(f"sum of waiting time: {operation['total_waiting_time']} minutes")
+# 14 print(f"daily average waiting time: {daily['waiting_time']} minutes")
+# 15 print(f"net profit concidering waiting time: {round(float(daily['net_profit']))}")
+
+    return {
+        **operation,
+        'profit': float(daily['profit']),
+        'waiting_time': float(daily['waiting_time']),
+        'waiting_cost_waste': float(daily['waiting_cost_waste']),
+        'net_profit': float(daily['net_profit']),
+    }
+
+
+def price_cached_day(inputs, operation, case, day, options):
+    """Price a day read from result_cache.ResultCache as the (case, day) replication of options.
+
+    A cached day may have been simulated for another case or scenario with identical inputs,
+    so case, day and scenario are taken from the arguments instead of the cached record.
+
+    :param inputs: dict returned by load_inputs.
+    :param operation: dict returned by operate_day, read from the cache.
+    :param case: Case index (0-based).
+    :param day: Day index (0-based).
+    :param options: dict of simulation options. Missing keys take values of DEFAULT_OPTIONS.
+    :return: dict with the same keys as the result of simulate_day.
+    """
+    scenario = simulation_options(options)['scenario']
+    return price_day(inputs, {**operation, 'case': case, 'day': day, 'scenario': scenario}, options)
+
+
+def simulate_day(inputs, case, day, options):
+    """Simulate one day of one timetable case and calculate its statistics and costs.
+
+    :param inputs: dict returned by load_inputs.
+    :param case: Case index (0-based).
+    :param day: Day index (0-based).
+    :param options: dict of simulation options. Missing keys take values of DEFAULT_OPTIONS.
+    :return: dict of daily statistics and hourly summaries of the replication.
+    """
+    return price_day(inputs, operate_day(inputs, case, day, options), options)
+
+
+def _init_worker(inputs):
+    """Store input tables once per worker process instead of pickling them for every task.
+
+    :param inputs: dict returned by load_inputs.
+    """
+    global _worker_inputs
+    _worker_inputs = inputs
+
+
+def _simulate_day_in_worker(case, day, options):
+    return simulate_day(_worker_inputs, case, day, options)
+
+
+def _operate_day_in_worker(case, day, options):
+    return operate_day(_worker_inputs, case, day, options)
+
+
+def run_tasks(inputs, tasks, n_workers=None, cache=None, ordered=False):
+    """Simulate (case, day, options) tasks, in worker processes if n_workers is not 1.
+
+    :param inputs: dict returned by load_inputs.
+    :param tasks: List of (case, day, options) tuples passed to simulate_day.
+    :param n_workers: Number of worker processes. None uses every core, 1 runs in this process.
+    :param cache: result_cache.ResultCache of simulated days, or None.
+        Cached days are only priced, the others are simulated and added to the cache.
+    :param ordered: If True, results are yielded in order of tasks, so tasks which share
+        (case, day) can be told apart. (ex: candidates of optimizer.TimetableOptimizer)
+    :return: generator of simulate_day results in order of completion, or of tasks if ordered.
+    """
+    if cache is not None:
+        hits = {}
+        misses = []
+        for i, (case, day, options) in enumerate(tasks):
+            key = cache.key(case, day, options)
+            operation = cache.get(key)
+            if operation is None:
+                misses.append((key, (case, day, options)))
+            elif ordered:
+                hits[i] = price_cached_day(inputs, operation, case, day, options)
+            else:
+                yield price_cached_day(inputs, operation, case, day, options)
+        simulated = _operate_tasks(inputs, misses, n_workers, cache, ordered)
+        if not ordered:
+            yield from simulated
+            return
+        for i in range(len(tasks)):
+            yield hits[i] if i in hits else next(simulated)
+        simulated.close()
+        return
+
+    if n_workers == 1:
+        for task in tasks:
+            yield simulate_day(inputs, *task)
+        return
+
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(inputs,)) as pool:
+        futures = [pool.submit(_simulate_day_in_worker, *task) for task in tasks]
+        for future in futures if ordered else as_completed(futures):
+            yield future.result()
+
+
+def _operate_tasks(inputs, keyed_tasks, n_workers, cache, ordered=False):
+    """Simulate (key, task) pairs missed by cache, store each day in it and price it."""
+    if n_workers == 1 or not keyed_tasks:
+        for key, task in keyed_tasks:
+            operation = operate_day(inputs, *task)
+            cache.put(key, operation)
+            yield price_day(inputs, operation, task[2])
+        return
+
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(inputs,)) as pool:
+        futures = {pool.submit(_operate_day_in_worker, *task): (key, task) for key, task in keyed_tasks}
+        for future in list(futures) if ordered else as_completed(futures):
+            key, task = futures[future]
+            operation = future.result()
+            cache.put(key, operation)
+            yield price_day(inputs, operation, task[2])
+
+
+def run_sweep(inputs, cases, n_days, options, n_workers=None, cache=None, resumed=None):
+    """Simulate every (case, day) replication, in worker processes if n_workers is not 1.
+
+    Each replication draws from streams seeded by replication_seed, so results do not depend
+    on the number of workers or on the order replications finish in.
+
+    :param inputs: dict returned by load_inputs.
+    :param cases: Iterable of case indices (0-based).
+    :param n_days: Number of days simulated per case.
+    :param options: dict of simulation options passed to simulate_day.
+    :param n_workers: Number of worker processes. None uses every core, 1 runs in this process.
+    :param cache: result_cache.ResultCache of simulated days, or None.
+    :param resumed: dict of simulate_day results keyed by (case, day), yielded first instead of
+        simulated again. (ex: checkpoint.Checkpoint.load)
+    :return: generator of simulate_day results in order of completion.
+    """
+    resumed = resumed or {}
+    replications = [(case, day) for case in cases for day in range(n_days)]
+    yield from (resumed[replication] for replication in replications if replication in resumed)
+    tasks = [(case, day, options) for case, day in replications if (case, day) not in resumed]
+    yield from run_tasks(inputs, tasks, n_workers, cache)
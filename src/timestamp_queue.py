@@ -0,0 +1,47 @@
+from array import array
+from bisect import bisect_left
+
+
+class TimestampQueue:
+    """FIFO queue of passenger arrival timestamps backed by a compact float array.
+
+    Replaces a simpy.Store of Passenger objects in compact queue mode. A passenger is only the time
+    it started waiting, so a queue costs 8 bytes per waiting passenger and batch removal needs
+    no simpy event.
+    Timestamps are appended in simulation time order, so the queue is always sorted.
+
+    """
+    def __init__(self):
+        self._buffer = array('d')
+        self._head = 0  # index of the oldest timestamp in _buffer
+
+    def __len__(self):
+        return len(self._buffer) - self._head
+
+    def append(self, timestamp):
+        """Add a passenger who started waiting at timestamp to the end of the queue.
+
+        :param timestamp: Simulation time when the passenger arrived.
+        """
+        self._buffer.append(timestamp)
+
+    def count_before(self, timestamp):
+        """Count passengers who started waiting before timestamp.
+
+        :param timestamp: Simulation time.
+        :return: int
+        """
+        return bisect_left(self._buffer, timestamp, self._head) - self._head
+
+    def popleft(self, n):
+        """Remove the n oldest passengers from the queue.
+
+        :param n: Number of passengers to remove.
+        :return: array.array of their arrival timestamps, oldest first.
+        """
+        timestamps = self._buffer[self._head:self._head + n]
+        self._head += len(timestamps)
+        if self._head > 1024 and 2 * self._head > len(self._buffer):  # reclaim space of removed passengers
+            del self._buffer[:self._head]
+            self._head = 0
+        return timestamps